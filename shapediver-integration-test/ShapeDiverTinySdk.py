@@ -1,106 +1,185 @@
+import contextvars
+import hashlib
 import json
+import logging
+import mmap
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from functools import partial
+from types import MappingProxyType
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
 
-fileEndingToContentTypeMap = {
-    "svg": "image/svg+xml",
-    "svgz": "image/svg+xml",
-    "jpg": "image/jpeg",
-    "jpeg": "image/jpeg",
-    "png": "image/png",
-    "gif": "image/gif",
-    "bmp": "image/bmp",
-    "tif": "image/tif",
-    "tiff": "image/tiff",
-    "hdr": "image/vnd.radiance",
-    "gltf": "gltf+json",
-    "glb": "model/gltf-binary",
-    "bin": "application/octet-stream",
-    "gltf": "model/gltf-binary",
-    "3dm": "model/vnd.3dm",
-    "3dm": "application/3dm",
-    "3dm": "x-world/x-3dmf",
-    "3ds": "application/x-3ds",
-    "3ds": "image/x-3ds",
-    "3ds": "application/3ds",
-    "fbx": "application/fbx",
-    "dxf": "application/dxf",
-    "dxf": "application/x-autocad",
-    "dxf": "application/x-dxf",
-    "dxf": "drawing/x-dxf",
-    "dxf": "image/vnd.dxf",
-    "dxf": "image/x-autocad",
-    "dxf": "image/x-dxf",
-    "dxf": "zz-application/zz-winassoc-dxf",
-    "dwg": "application/dwg",
-    "pdf": "application/pdf",
-    "3mf": "model/3mf",
-    "stl": "model/stl",
-    "stl": "application/sla",
-    "amf": "application/amf",
-    "ai": "application/ai",
-    "dgn": "application/dgn",
-    "ply": "application/ply",
-    "ps": "application/postscript",
-    "eps": "application/postscript",
-    "skp": "application/skp",
-    "slc": "application/slc",
-    "sldprt": "application/sldprt",
-    "sldasm": "application/sldasm",
-    "stp": "application/step",
-    "step": "application/step",
-    "vda": "application/vda",
-    "gdf": "application/gdf",
-    "vrml": "model/vrml",
-    "vrml": "model/x3d-vrml",
-    "wrl": "model/vrml",
-    "wrl": "model/x3d-vrml",
-    "vi": "model/vrml",
-    "vi": "model/x3d-vrml",
-    "igs": "model/iges",
-    "iges": "model/iges",
-    "igs": "application/iges",
-    "iges": "application/iges",
-    "obj": "application/wavefront-obj",
-    "obj": "model/obj",
-    "off": "application/off",
-    "txt": "text/plain",
-    "mtl": "text/plain",
-    "g": "text/plain",
-    "gcode": "text/plain",
-    "glsl": "text/plain",
-    "csv": "text/csv",
-    "csv": "application/vnd.ms-excel",
-    "xls": "application/vnd.ms-excel",
-    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    "doc": "application/msword",
-    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    "rtf": "application/rtf",
-    "zip": "application/zip",
-    "xml": "application/xml",
-    "xml": "text/xml",
-    "json": "application/json",
-    "ifc": "application/x-step",
-    "ifcxml": "application/xml",
-    "ifczip": "application/zip",
-    "sdtf": "model/vnd.sdtf",
-    "sddtf": "model/vnd.sdtf"
-}
+try:
+    # optional faster JSON parser
+    import orjson
+except ImportError:
+    orjson = None
 
-def mapFileEndingToContentType(fileEnding):
-    if "." in fileEnding:
-        fileEnding = fileEnding.split(".")[-1]
-    if fileEnding in fileEndingToContentTypeMap.keys():
-        return fileEndingToContentTypeMap[fileEnding]
-    else:
+"""Pairs of file endings and content types, preferred content types and file endings first"""
+fileEndingContentTypes = (
+    ("svg", "image/svg+xml"),
+    ("svgz", "image/svg+xml"),
+    ("jpg", "image/jpeg"),
+    ("jpeg", "image/jpeg"),
+    ("png", "image/png"),
+    ("gif", "image/gif"),
+    ("bmp", "image/bmp"),
+    ("tif", "image/tif"),
+    ("tiff", "image/tiff"),
+    ("hdr", "image/vnd.radiance"),
+    ("gltf", "model/gltf+json"),
+    ("glb", "model/gltf-binary"),
+    ("bin", "application/octet-stream"),
+    ("gltf", "model/gltf-binary"),
+    ("3dm", "model/vnd.3dm"),
+    ("3dm", "application/3dm"),
+    ("3dm", "x-world/x-3dmf"),
+    ("3ds", "application/x-3ds"),
+    ("3ds", "image/x-3ds"),
+    ("3ds", "application/3ds"),
+    ("fbx", "application/fbx"),
+    ("dxf", "application/dxf"),
+    ("dxf", "application/x-autocad"),
+    ("dxf", "application/x-dxf"),
+    ("dxf", "drawing/x-dxf"),
+    ("dxf", "image/vnd.dxf"),
+    ("dxf", "image/x-autocad"),
+    ("dxf", "image/x-dxf"),
+    ("dxf", "zz-application/zz-winassoc-dxf"),
+    ("dwg", "application/dwg"),
+    ("pdf", "application/pdf"),
+    ("3mf", "model/3mf"),
+    ("stl", "model/stl"),
+    ("stl", "application/sla"),
+    ("amf", "application/amf"),
+    ("ai", "application/ai"),
+    ("dgn", "application/dgn"),
+    ("ply", "application/ply"),
+    ("ps", "application/postscript"),
+    ("eps", "application/postscript"),
+    ("skp", "application/skp"),
+    ("slc", "application/slc"),
+    ("sldprt", "application/sldprt"),
+    ("sldasm", "application/sldasm"),
+    ("stp", "application/step"),
+    ("step", "application/step"),
+    ("vda", "application/vda"),
+    ("gdf", "application/gdf"),
+    ("vrml", "model/vrml"),
+    ("vrml", "model/x3d-vrml"),
+    ("wrl", "model/vrml"),
+    ("wrl", "model/x3d-vrml"),
+    ("vi", "model/vrml"),
+    ("vi", "model/x3d-vrml"),
+    ("igs", "model/iges"),
+    ("iges", "model/iges"),
+    ("igs", "application/iges"),
+    ("iges", "application/iges"),
+    ("obj", "application/wavefront-obj"),
+    ("obj", "model/obj"),
+    ("off", "application/off"),
+    ("txt", "text/plain"),
+    ("mtl", "text/plain"),
+    ("g", "text/plain"),
+    ("gcode", "text/plain"),
+    ("glsl", "text/plain"),
+    ("csv", "text/csv"),
+    ("csv", "application/vnd.ms-excel"),
+    ("xls", "application/vnd.ms-excel"),
+    ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ("doc", "application/msword"),
+    ("docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    ("rtf", "application/rtf"),
+    ("zip", "application/zip"),
+    ("xml", "application/xml"),
+    ("xml", "text/xml"),
+    ("json", "application/json"),
+    ("ifc", "application/x-step"),
+    ("ifcxml", "application/xml"),
+    ("ifczip", "application/zip"),
+    ("sdtf", "model/vnd.sdtf"),
+    ("sddtf", "model/vnd.sdtf")
+)
+
+class ShapeDiverMimeRegistry:
+    """Immutable bidirectional index of file endings and content types
+
+    Maps each file ending to all of its content types and each content type to all 
+    of its file endings, in the order given by the pairs.
+    """
+
+    def __init__(self, pairs):
+        contentTypes = {}
+        fileEndings = {}
+        for (fileEnding, contentType) in pairs:
+            if contentType not in contentTypes.setdefault(fileEnding, []):
+                contentTypes[fileEnding].append(contentType)
+            if fileEnding not in fileEndings.setdefault(contentType, []):
+                fileEndings[contentType].append(fileEnding)
+        self._contentTypes = MappingProxyType({key: tuple(value) for (key, value) in contentTypes.items()})
+        self._fileEndings = MappingProxyType({key: tuple(value) for (key, value) in fileEndings.items()})
+
+    def contentTypes(self, fileEnding):
+        """All content types of a file ending (or file name)"""
+
+        return self._contentTypes.get(self.fileEndingOf(fileEnding), ())
+
+    def fileEndings(self, contentType):
+        """All file endings of a content type"""
+
+        return self._fileEndings.get(contentType, ())
+
+    def contentType(self, fileEnding):
+        """Preferred content type of a file ending (or file name), None if unknown"""
+
+        contentTypes = self.contentTypes(fileEnding)
+        return contentTypes[0] if len(contentTypes) > 0 else None
+
+    def fileEnding(self, contentType):
+        """Preferred file ending of a content type, None if unknown"""
+
+        fileEndings = self.fileEndings(contentType)
+        return fileEndings[0] if len(fileEndings) > 0 else None
+
+    def negotiate(self, fileEnding, formats):
+        """Content type of a file ending (or file name) which is accepted by a parameter
+        
+        formats is the 'format' list of a parameter definition. Returns None if none of 
+        the content types of the file ending is accepted.
+        """
+
+        for contentType in self.contentTypes(fileEnding):
+            if contentType in formats:
+                return contentType
         return None
 
+    @staticmethod
+    def fileEndingOf(fileName):
+        if "." in fileName:
+            fileName = fileName.split(".")[-1]
+        return fileName.lower()
+
+mimeRegistry = ShapeDiverMimeRegistry(fileEndingContentTypes)
+
+"""Preferred content type by file ending, kept for backwards compatibility"""
+fileEndingToContentTypeMap = MappingProxyType({fileEnding: mimeRegistry.contentType(fileEnding) for (fileEnding, contentType) in fileEndingContentTypes})
+
+def mapFileEndingToContentType(fileEnding):
+    return mimeRegistry.contentType(fileEnding)
+
 def mapContentTypeToFileEnding(contentType):
-    if contentType in fileEndingToContentTypeMap.values():
-        for key, value in fileEndingToContentTypeMap.items():
-            if value == contentType:
-                return key
-    else:
-        return None
+    return mimeRegistry.fileEnding(contentType)
 
 def ShapeDiverColorToRgb(sdColor):
     return tuple(int(sdColor[i:i+2],16) for i in (2, 4, 6))
@@ -114,6 +193,235 @@ def RgbToShapeDiverColor(r, g, b):
 def flatten_nested_list(nested_list):
     return [item for sublist in nested_list for item in (flatten_nested_list(sublist) if isinstance(sublist, list) else [sublist])]
 
+def jsonLoads(data):
+    """Parse JSON (str or bytes), using orjson if it is installed"""
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def canonicalParameterValue(value):
+    """String representation of a parameter value as interpreted by the backend"""
+
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def canonicalParameters(paramDict):
+    """Canonical string representation of a dictionary of parameter values
+    
+    Parameter sets which result in the same computation result in the same string.
+    """
+
+    return json.dumps({key: canonicalParameterValue(value) for (key, value) in paramDict.items()}, sort_keys=True, separators=(',', ':'))
+
+class ShapeDiverSpan:
+    """Timed operation reported to the sinks of ShapeDiverInstrumentation when it ends
+
+    Labels have few distinct values (like the action of a request) and are used to
+    group measurements, attributes are arbitrary details (like an endpoint or a 
+    size in bytes). Spans of one trace share their traceId, parentId is the spanId 
+    of the enclosing span.
+    """
+
+    def __init__(self, *, name, labels, traceId, spanId, parentId):
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.traceId = traceId
+        self.spanId = spanId
+        self.parentId = parentId
+        self.start = time.time()
+        self.seconds = None
+        self.error = None
+
+    def label(self, **labels):
+        """Add labels"""
+
+        self.labels.update(labels)
+
+    def set(self, **attributes):
+        """Add attributes"""
+
+        self.attributes.update(attributes)
+
+class ShapeDiverDisabledSpan:
+    """Span handed out while no sinks are registered, discarding everything"""
+
+    def label(self, **labels):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+class ShapeDiverInstrumentation:
+    """Timing and size instrumentation of the hot paths of the SDK
+
+    Measurements are taken as spans (see span) and reported to the registered sinks,
+    which are objects with a method record(span), like ShapeDiverHistogramRegistry 
+    and ShapeDiverLogTracer. Spans started while another one is active (in the same 
+    thread or asyncio task, or in work submitted using bind) belong to its trace. 
+    Without sinks, spans cost next to nothing.
+    """
+
+    def __init__(self):
+        self.sinks = []
+        self.active = contextvars.ContextVar('shapediver-span', default=None)
+        self.disabledSpan = ShapeDiverDisabledSpan()
+
+    def addSink(self, sink):
+        """Register a sink"""
+
+        if sink not in self.sinks:
+            self.sinks = self.sinks + [sink]
+
+    def removeSink(self, sink):
+        """Unregister a sink"""
+
+        self.sinks = [other for other in self.sinks if other is not sink]
+
+    @contextmanager
+    def span(self, name, **labels):
+        """Measure the enclosed block, use in a with statement
+
+        Exceptions are recorded as attribute 'error' and label outcome 'error'.
+        """
+
+        sinks = self.sinks
+        if len(sinks) == 0:
+            yield self.disabledSpan
+            return
+        parent = self.active.get()
+        span = ShapeDiverSpan(name = name, labels = labels, traceId = parent.traceId if parent is not None else '%032x' % random.getrandbits(128),
+            spanId = '%016x' % random.getrandbits(64), parentId = parent.spanId if parent is not None else None)
+        token = self.active.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+            span.labels.setdefault('outcome', 'ok')
+        except BaseException as e:
+            span.error = f'{type(e).__name__}: {e}'
+            span.labels['outcome'] = 'error'
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.active.reset(token)
+            for sink in sinks:
+                sink.record(span)
+
+    def bind(self, func):
+        """Bind func to the active span, for calling it in another thread"""
+
+        if len(self.sinks) == 0:
+            return func
+        return partial(contextvars.copy_context().run, func)
+
+"""Instrumentation used by the SDK, register sinks to receive its measurements"""
+instrumentation = ShapeDiverInstrumentation()
+
+class ShapeDiverHistogramRegistry:
+    """In-process registry of histograms, a sink for ShapeDiverInstrumentation
+
+    Records the duration of spans as histogram 'shapediver_{name}_seconds', and
+    attributes ending in 'bytes' as 'shapediver_{name}_{attribute}', labelled by
+    the labels of the span. Use prometheus to export them in the Prometheus text format.
+    """
+
+    def __init__(self, *, secondsBuckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60), 
+            bytesBuckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)):
+        self.secondsBuckets = tuple(secondsBuckets)
+        self.bytesBuckets = tuple(bytesBuckets)
+        """Histograms keyed on metric name and sorted label pairs, see observe"""
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def record(self, span):
+        labels = tuple(sorted(span.labels.items()))
+        self.observe(f'shapediver_{span.name}_seconds', span.seconds, labels = labels, buckets = self.secondsBuckets)
+        for (key, value) in span.attributes.items():
+            if key.lower().endswith('bytes') and isinstance(value, (int, float)):
+                self.observe(f'shapediver_{span.name}_{re.sub("(?<!^)(?=[A-Z])", "_", key).lower()}', value, labels = labels, buckets = self.bytesBuckets)
+
+    def observe(self, name, value, *, labels=(), buckets=None):
+        """Add a value to a histogram, labels is a tuple of (name, value) pairs"""
+
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                bounds = buckets if buckets is not None else self.secondsBuckets
+                histogram = {'bounds': bounds, 'counts': [0] * len(bounds), 'sum': 0, 'count': 0}
+                self.histograms[(name, labels)] = histogram
+            for (index, bound) in enumerate(histogram['bounds']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        """Count, sum and cumulative bucket counts of all histograms, keyed on name and labels"""
+
+        with self.lock:
+            return {key: {'count': histogram['count'], 'sum': histogram['sum'], 
+                'buckets': list(zip(histogram['bounds'], self._cumulative(histogram['counts'])))} for (key, histogram) in self.histograms.items()}
+
+    def prometheus(self):
+        """All histograms in the Prometheus text exposition format"""
+
+        lines = []
+        typed = set()
+        for ((name, labels), histogram) in sorted(self.snapshot().items()):
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            for (bound, count) in histogram['buckets']:
+                lines.append(f'{name}_bucket{self._labels(labels + (("le", repr(float(bound))),))} {count}')
+            lines.append(f'{name}_bucket{self._labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+            lines.append(f'{name}_sum{self._labels(labels)} {repr(float(histogram["sum"]))}')
+            lines.append(f'{name}_count{self._labels(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Remove all histograms"""
+
+        with self.lock:
+            self.histograms = {}
+
+    def _cumulative(self, counts):
+        total = 0
+        cumulative = []
+        for count in counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+    def _labels(self, labels):
+        if len(labels) == 0:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for (_, value) in labels)
+        return '{' + ','.join(f'{name}="{value}"' for ((name, _), value) in zip(labels, escaped)) + '}'
+
+class ShapeDiverLogTracer:
+    """Sink for ShapeDiverInstrumentation logging every span as one JSON object
+
+    The trace and span ids tie the spans of one view call to its backend requests.
+    """
+
+    def __init__(self, *, logger=None, level=logging.INFO):
+        self.logger = logger if logger is not None else logging.getLogger('shapediver.trace')
+        self.level = level
+
+    def record(self, span):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        entry = {'span': span.name, 'traceId': span.traceId, 'spanId': span.spanId, 'parentId': span.parentId, 
+            'start': span.start, 'seconds': span.seconds, 'labels': span.labels, 'attributes': span.attributes}
+        if span.error is not None:
+            entry['error'] = span.error
+        self.logger.log(self.level, json.dumps(entry, default=str))
+
 class ShapeDiverResponse:
     """Wrapper for response objects from ShapeDiver Geometry Backend systems
 
@@ -121,10 +429,14 @@ class ShapeDiverResponse:
     """
 
     def __init__(self, response):
-        if isinstance(response, str):
-            self.response = json.loads(response)
+        if isinstance(response, (str, bytes)):
+            with instrumentation.span('parse') as span:
+                span.set(bytes = len(response))
+                self.response = jsonLoads(response)
         else:
             self.response = response
+        """Lazily built lists and indexes, see _cached"""
+        self._cache = {}
 
     def parameters(self):
         """Parameter definitions
@@ -132,7 +444,22 @@ class ShapeDiverResponse:
         Look for ResponseParameter in the API documentation.
         """
 
-        return [value for (key, value) in self.response['parameters'].items()]
+        return self._cached('parameters', lambda: list(self.response['parameters'].values()))
+
+    def parameterById(self, paramId):
+        """Parameter definition by id, None if there is no such parameter"""
+
+        return self.response['parameters'].get(paramId)
+
+    def parameterByName(self, name):
+        """Parameter definition by name, None if there is no such parameter"""
+
+        return self._index('parameters', 'name').get(name)
+
+    def parameterByDisplayname(self, displayname):
+        """Parameter definition by displayname, None if there is no such parameter"""
+
+        return self._index('parameters', 'displayname').get(displayname)
 
     def outputs(self):
         """Output definitions and results
@@ -140,7 +467,22 @@ class ShapeDiverResponse:
         Look for ResponseOutput in the API documentation.
         """
 
-        return [value for (key, value) in self.response['outputs'].items()]
+        return self._cached('outputs', lambda: list(self.response['outputs'].values()))
+
+    def outputById(self, outputId):
+        """Output definition by id, None if there is no such output"""
+
+        return self.response['outputs'].get(outputId)
+
+    def outputByName(self, name):
+        """Output definition by name, None if there is no such output"""
+
+        return self._index('outputs', 'name').get(name)
+
+    def outputByDisplayname(self, displayname):
+        """Output definition by displayname, None if there is no such output"""
+
+        return self._index('outputs', 'displayname').get(displayname)
        
     def outputContentItems(self):
         """Content resulting from outputs
@@ -148,7 +490,12 @@ class ShapeDiverResponse:
         Look for ResponseOutputContent in the API documentation.
         """
 
-        return flatten_nested_list([outputs['content'] for outputs in self.outputs()])
+        return self._cached('outputContentItems', lambda: flatten_nested_list([outputs.get('content', []) for outputs in self.outputs()]))
+
+    def outputContentItemsByContentType(self, contentType):
+        """Content of the given content type resulting from outputs"""
+
+        return self._contentTypeIndex('outputContentItems').get(contentType, [])
 
     def outputContentItemsGltf2(self):
         """glTF 2 content resulting from outputs
@@ -156,7 +503,29 @@ class ShapeDiverResponse:
         Look for ResponseOutputContent in the API documentation.
         """
 
-        return [item for item in self.outputContentItems() if item['contentType'] == 'model/gltf-binary']
+        return self.outputContentItemsByContentType('model/gltf-binary')
+
+    def outputOfContentItem(self, item):
+        """Output definition a content item of this response results from, None if there is none"""
+
+        index = self._cached('outputOfContentItem', lambda: {id(contentItem): output for output in self.outputs() for contentItem in output.get('content', [])})
+        return index.get(id(item))
+
+    def outputVersions(self):
+        """Versions of the outputs, keyed on output id"""
+
+        return self._cached('outputVersions', lambda: {output['id']: output.get('version') for output in self.outputs()})
+
+    def changedOutputs(self, previous):
+        """Ids of the outputs whose version differs from a previous response
+
+        Outputs without a version, and all outputs if previous is None, are 
+        considered changed. Outputs with an unchanged version have the same content.
+        """
+
+        previousVersions = previous.outputVersions() if previous is not None else {}
+        return [outputId for (outputId, version) in self.outputVersions().items() 
+            if version is None or previousVersions.get(outputId) != version]
 
     def exports(self):
         """Export definitions and results
@@ -164,7 +533,22 @@ class ShapeDiverResponse:
         Look for ResponseExport in the API documentation.
         """
 
-        return [value for (key, value) in self.response['exports'].items()]
+        return self._cached('exports', lambda: list(self.response['exports'].values()))
+
+    def exportById(self, exportId):
+        """Export definition by id, None if there is no such export"""
+
+        return self.response['exports'].get(exportId)
+
+    def exportByName(self, name):
+        """Export definition by name, None if there is no such export"""
+
+        return self._index('exports', 'name').get(name)
+
+    def exportByDisplayname(self, displayname):
+        """Export definition by displayname, None if there is no such export"""
+
+        return self._index('exports', 'displayname').get(displayname)
     
     def exportContentItems(self):
         """Content resulting from exports
@@ -172,8 +556,113 @@ class ShapeDiverResponse:
         Look for ResponseExportContent in the API documentation.
         """
 
-        return flatten_nested_list([exports['content'] for exports in self.exports()])
-    
+        return self._cached('exportContentItems', lambda: flatten_nested_list([exports.get('content', []) for exports in self.exports()]))
+
+    def exportContentItemsByContentType(self, contentType):
+        """Content of the given content type resulting from exports"""
+
+        return self._contentTypeIndex('exportContentItems').get(contentType, [])
+
+    def _cached(self, key, build):
+        """Build a list or index once, the response is not expected to change"""
+
+        value = self._cache.get(key)
+        if value is None:
+            value = build()
+            self._cache[key] = value
+        return value
+
+    def _index(self, kind, field):
+        """Index of parameter, output or export definitions by the given field, first definition wins"""
+
+        def build():
+            index = {}
+            for item in getattr(self, kind)():
+                if item.get(field) is not None:
+                    index.setdefault(item[field], item)
+            return index
+        return self._cached((kind, field), build)
+
+    def _contentTypeIndex(self, kind):
+        """Index of output or export content items by content type"""
+
+        def build():
+            index = {}
+            for item in getattr(self, kind)():
+                index.setdefault(item.get('contentType'), []).append(item)
+            return index
+        return self._cached((kind, 'contentType'), build)
+
+    def delay(self, *, exportIds=None):
+        """Delay in milliseconds until the requested outputs or exports are ready
+
+        Returns None if all outputs (or the given exports) have been computed.
+        """
+
+        if exportIds is None:
+            items = self.response.get('outputs', {}).values()
+        else:
+            exports = self.response.get('exports', {})
+            items = [exports[exportId] for exportId in exportIds if exportId in exports]
+        delays = [item['delay'] for item in items if item.get('delay', 0) > 0]
+        return max(delays) if len(delays) > 0 else None
+
+    def modelId(self):
+        """Id of the model, if contained in the response"""
+
+        return self.response.get('model', {}).get('id')
+
+    def downloadContentItems(self, items, *, mode='file'):
+        """Download the assets of content items concurrently
+
+        See downloadAssets, items are typically taken from outputContentItems or exportContentItems.
+        """
+
+        return downloadAssets(items, mode = mode)
+
+    def defaultParameterValues(self):
+        """Default values of all parameters, keyed on parameter id"""
+
+        return self._cached('defaultParameterValues', lambda: {paramDef['id']: paramDef.get('defval') for paramDef in self.parameters()})
+
+    def effectiveParameterValues(self, paramDict):
+        """Values of all parameters used by a computation, defaults completed by the given values
+
+        Values are typed by their parameter definitions (see typedParameterValue), so
+        that the values of a parameter can be compared and filtered numerically.
+        """
+
+        defaults = self._cached('typedDefaultParameterValues', lambda: {paramDef['id']: self.typedParameterValue(paramDef, paramDef.get('defval')) for paramDef in self.parameters()})
+        values = dict(defaults)
+        for (paramId, value) in paramDict.items():
+            paramDef = self.parameterById(paramId)
+            values[paramId] = self.typedParameterValue(paramDef, value) if paramDef is not None else value
+        return values
+
+    @staticmethod
+    def typedParameterValue(paramDef, value):
+        """Value of a parameter typed by its definition
+
+        Numbers become int or float, Bool values 0 or 1, and StringList values the 
+        index of the choice. Other values, and values which can't be converted, are
+        returned unchanged.
+        """
+
+        paramType = paramDef['type']
+        if paramType in ('Float', 'Int', 'Odd', 'Even') and not isinstance(value, bool):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                return value
+            return int(number) if paramType != 'Float' and number.is_integer() else number
+        if paramType == 'Bool':
+            if isinstance(value, bool):
+                return int(value)
+            return {'true': 1, 'false': 0}.get(str(value).lower(), value)
+        if paramType == 'StringList' and str(value).strip().isdigit():
+            return int(value)
+        return value
+
     def sessionId(self):
         """Id of the session"""
 
@@ -187,6 +676,901 @@ class ShapeDiverResponse:
 
         return self.response['asset']['file'][paramId]
     
+class ShapeDiverHttpAdapter(HTTPAdapter):
+    """HTTPAdapter counting the connections opened by its pools
+
+    urllib3 re-opens dropped connections using the same connection object, the
+    number of connection objects of a pool therefore does not tell how many TCP
+    (and TLS) connections were opened. Without keepAlive, connections are closed
+    when they are returned to their pool, servers may not answer 'Connection: close'
+    in kind and close them only after the next request was sent.
+    """
+
+    def __init__(self, *, keepAlive=True, **kwargs):
+        self.keepAlive = keepAlive
+        self.connects = 0
+        self.connectsLock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pools = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {scheme: self._countingPool(pool) for (scheme, pool) in pools.items()}
+
+    def _countingPool(self, poolClass):
+        adapter = self
+        class CountingConnection(poolClass.ConnectionCls):
+            def connect(self):
+                with adapter.connectsLock:
+                    adapter.connects += 1
+                super().connect()
+        class CountingPool(poolClass):
+            ConnectionCls = CountingConnection
+            def _put_conn(self, conn):
+                if not adapter.keepAlive and conn is not None:
+                    conn.close()
+                super()._put_conn(conn)
+        return CountingPool
+
+class ShapeDiverHttpTransport:
+    """Pooled keep-alive HTTP transport
+
+    Wraps a requests session whose connection pool is shared by all threads and
+    ShapeDiverTinySessionSdk instances talking to the same origin.
+    """
+
+    def __init__(self, *, poolSize=10, keepAlive=True, poolBlock=False):
+        self.poolSize = poolSize
+        self.keepAlive = keepAlive
+        self.adapter = ShapeDiverHttpAdapter(keepAlive=keepAlive, pool_connections=1, pool_maxsize=poolSize, pool_block=poolBlock)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        if not keepAlive:
+            self.session.headers['Connection'] = 'close'
+
+    def request(self, method, url, **kwargs):
+        """Send a request using a pooled connection"""
+
+        return self.session.request(method, url, **kwargs)
+
+    def stats(self):
+        """Pool hit/miss counters
+        
+        A hit is a request served by an already open connection, a miss
+        required a new TCP (and TLS) connection to be opened.
+        """
+
+        pools = self.adapter.poolmanager.pools
+        requestCount = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                requestCount += pool.num_requests
+        connectionCount = self.adapter.connects
+        return {'hits': max(requestCount - connectionCount, 0), 'misses': connectionCount, 'requests': requestCount}
+
+    def close(self):
+        """Close all pooled connections"""
+
+        self.session.close()
+
+httpTransportOptions = {'poolSize': 10, 'keepAlive': True, 'poolBlock': False}
+_httpTransports = {}
+_httpTransportsLock = threading.Lock()
+
+def configureHttpTransport(*, poolSize=None, keepAlive=None, poolBlock=None):
+    """Configure transports created by httpTransport
+    
+    Transports which already exist are closed and replaced on their next use.
+    """
+
+    with _httpTransportsLock:
+        if poolSize is not None:
+            httpTransportOptions['poolSize'] = poolSize
+        if keepAlive is not None:
+            httpTransportOptions['keepAlive'] = keepAlive
+        if poolBlock is not None:
+            httpTransportOptions['poolBlock'] = poolBlock
+        for transport in _httpTransports.values():
+            transport.close()
+        _httpTransports.clear()
+
+def httpTransport(url):
+    """Get the shared transport for the origin (scheme and host) of the given url"""
+
+    parts = urlsplit(url)
+    origin = f'{parts.scheme}://{parts.netloc}'
+    with _httpTransportsLock:
+        transport = _httpTransports.get(origin)
+        if transport is None:
+            transport = ShapeDiverHttpTransport(**httpTransportOptions)
+            _httpTransports[origin] = transport
+        return transport
+
+def httpTransportStats():
+    """Pool hit/miss counters of all shared transports, by origin"""
+
+    with _httpTransportsLock:
+        transports = dict(_httpTransports)
+    return {origin: transport.stats() for (origin, transport) in transports.items()}
+
+class ShapeDiverDownload:
+    """Asset downloaded by downloadAssets
+
+    Depending on the download mode, the content is available as a file (path), as a
+    read-only memory-mapped buffer or in memory (buffer). The size in bytes, the 
+    time taken by the download in seconds, and whether it was served from a cache 
+    are reported as well.
+    """
+
+    def __init__(self, *, href, contentType, size, seconds, path=None, buffer=None, cached=False):
+        self.href = href
+        self.contentType = contentType
+        self.size = size
+        self.seconds = seconds
+        self.path = path
+        self.buffer = buffer
+        self.cached = cached
+
+    def data(self):
+        """Content of the asset as bytes"""
+
+        if self.buffer is not None:
+            return bytes(self.buffer)
+        with open(self.path, 'rb') as file:
+            return file.read()
+
+"""Executor for downloads, its number of workers bounds the number of concurrent downloads"""
+downloadExecutor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='shapediver-download')
+
+"""Directory for downloaded files, files older than downloadRetention seconds are removed"""
+downloadDirectory = os.path.join(tempfile.gettempdir(), 'shapediver-downloads')
+downloadRetention = 600
+downloadChunkSize = 1024 * 1024
+
+def downloadAssets(items, *, mode='file'):
+    """Download the assets of content items concurrently, streaming them in chunks
+
+    Items are dictionaries containing 'href' and 'contentType', like content items of
+    outputs and exports. Mode 'file' stores assets in downloadDirectory, 'mmap' maps
+    them read-only into memory (the file is removed right away), and 'memory' keeps 
+    them as bytes. Returns a list of ShapeDiverDownload in the order of the items.
+    """
+
+    if mode not in ('file', 'mmap', 'memory'):
+        raise Exception(f'Unknown download mode {mode}')
+    if mode != 'memory':
+        os.makedirs(downloadDirectory, exist_ok=True)
+        __pruneDownloadDirectory()
+    futures = [downloadExecutor.submit(instrumentation.bind(__downloadAsset), item, mode) for item in items]
+    return [future.result() for future in futures]
+
+def __downloadAsset(item, mode):
+    with instrumentation.span('download', mode=mode) as span:
+        download = __streamAsset(item, mode)
+        span.set(href = download.href, bytes = download.size)
+        return download
+
+def __streamAsset(item, mode):
+    href = item['href']
+    start = time.perf_counter()
+    response = httpTransport(href).request('GET', href, stream=True)
+    with response:
+        if response.status_code != 200:
+            raise Exception(f'Failed to download asset (HTTP status code {response.status_code}): {href}')
+        if mode == 'memory':
+            buffer = bytearray()
+            for chunk in response.iter_content(downloadChunkSize):
+                buffer.extend(chunk)
+            return ShapeDiverDownload(href = href, contentType = item.get('contentType'), size = len(buffer), 
+                seconds = time.perf_counter() - start, buffer = bytes(buffer))
+        fileEnding = mapContentTypeToFileEnding(item.get('contentType'))
+        (fd, path) = tempfile.mkstemp(suffix = f'.{fileEnding}' if fileEnding is not None else '', dir = downloadDirectory)
+        size = 0
+        with os.fdopen(fd, 'wb') as file:
+            for chunk in response.iter_content(downloadChunkSize):
+                file.write(chunk)
+                size += len(chunk)
+    if mode == 'file':
+        return ShapeDiverDownload(href = href, contentType = item.get('contentType'), size = size, 
+            seconds = time.perf_counter() - start, path = path)
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size > 0 else b''
+    os.remove(path)
+    return ShapeDiverDownload(href = href, contentType = item.get('contentType'), size = size, 
+        seconds = time.perf_counter() - start, buffer = buffer)
+
+def __pruneDownloadDirectory():
+    threshold = time.time() - downloadRetention
+    for entry in os.scandir(downloadDirectory):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < threshold:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+class ShapeDiverRetryPolicy:
+    """Retry scheduler for rate-limited and delayed requests
+
+    Requests answered with one of retryStatusCodes are retried after the time given
+    by their Retry-After header, or after a jittered exponential backoff if there is none.
+    Requests which are not idempotent, like opening a session, are only retried if
+    rate-limited (429): a gateway error may arrive after the backend acted on them.
+    Computations which the backend reports as delayed are polled using the delay it 
+    suggests, again with jitter. All waiting happens within an overall deadline (seconds).
+
+    onRetry is called before every wait with a dict containing 'action', 'reason' 
+    ('rateLimit', 'status' or 'delay'), 'statusCode', 'attempt', 'wait' and 'elapsed' 
+    (seconds), which allows to tell backend queueing apart from client side latency.
+    """
+
+    def __init__(self, *, maxRetries=20, deadline=120, baseDelay=0.5, maxDelay=10, jitter=0.2, retryStatusCodes=(429, 502, 503, 504), onRetry=None):
+        self.maxRetries = maxRetries
+        self.deadline = deadline
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.jitter = jitter
+        self.retryStatusCodes = retryStatusCodes
+        self.onRetry = onRetry
+
+    def backoff(self, attempt):
+        """Exponential backoff with full jitter for the given (zero based) attempt"""
+
+        return random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+
+    def retryAfter(self, response):
+        """Wait time in seconds requested by the Retry-After header of a response, if any"""
+
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            return None
+
+    def retryable(self, statusCode, *, idempotent=True):
+        """Whether a request answered with the given status code is retried"""
+
+        return statusCode in self.retryStatusCodes and (idempotent or statusCode == 429)
+
+    def delayWait(self, delay, attempt):
+        """Wait time in seconds before polling a computation the backend reported as delayed by delay milliseconds"""
+
+        wait = delay / 1000 if delay is not None else self.backoff(attempt)
+        return min(self.maxDelay, wait * random.uniform(1, 1 + self.jitter))
+
+    def report(self, event):
+        """Pass a retry event to the hook"""
+
+        if self.onRetry is not None:
+            self.onRetry(event)
+
+"""Retry policy used by sessions which do not specify their own one"""
+defaultRetryPolicy = ShapeDiverRetryPolicy()
+
+class ShapeDiverLruCache:
+    """Thread-safe LRU cache with optional time-to-live (seconds) and byte budget
+
+    The size of an entry is given when storing it, or determined using sizeOf.
+    """
+
+    def __init__(self, *, maxEntries=256, ttl=None, maxBytes=None, sizeOf=None):
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.sizeOf = sizeOf
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Get a cached value, marking it as most recently used"""
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+                self._remove(key)
+                self.counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.counters['misses'] += 1
+                return default
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value, *, size=None, ttl=None):
+        """Store a value, evicting least recently used entries to stay within the limits"""
+
+        if size is None:
+            size = self.sizeOf(value) if self.sizeOf is not None else 0
+        if self.maxBytes is not None and size > self.maxBytes:
+            return
+        with self.lock:
+            self._insert(key, value, size = size, ttl = ttl)
+
+    def pop(self, key):
+        """Remove an entry, returns its value or None"""
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self._remove(key)
+            return entry[0]
+
+    def clear(self):
+        """Remove all entries"""
+
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def expire(self, key, *, ttl):
+        """Let an entry expire ttl seconds from now (math.inf for never), returns whether it exists"""
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False
+            self.entries[key] = (entry[0], time.monotonic() + ttl, entry[2])
+            return True
+
+    def reserve(self, entries):
+        """Raise maxEntries so that the given number of entries fits besides the current ones
+
+        maxBytes is raised in proportion, keeping the byte budget per entry.
+        """
+
+        with self.lock:
+            maxEntries = len(self.entries) + entries
+            if maxEntries <= self.maxEntries:
+                return
+            if self.maxBytes is not None:
+                self.maxBytes = self.maxBytes * maxEntries // self.maxEntries
+            self.maxEntries = maxEntries
+
+    def stats(self):
+        """Hit, miss, eviction and expiration counters, number of entries and bytes used"""
+
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.bytes)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _insert(self, key, value, *, size, ttl):
+        """Store a value and evict entries exceeding the limits, called with the lock held"""
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (value, expires, size)
+        self.bytes += size
+        while len(self.entries) > self.maxEntries or (self.maxBytes is not None and self.bytes > self.maxBytes):
+            self._remove(next(iter(self.entries)))
+            self.counters['evictions'] += 1
+
+    def _remove(self, key):
+        self.bytes -= self.entries.pop(key)[2]
+
+class ShapeDiverResultCache(ShapeDiverLruCache):
+    """Cache for results of output and export requests
+
+    Results are keyed on the model, the export (None for outputs) and the canonical
+    parameter values after the parameter mapper has been applied. The size of a result 
+    is the length of its JSON representation.
+    """
+
+    def __init__(self, *, maxEntries=256, ttl=1800, maxBytes=64 * 1024 * 1024):
+        super().__init__(maxEntries=maxEntries, ttl=ttl, maxBytes=maxBytes, sizeOf=lambda result: len(json.dumps(result.response)))
+
+    @staticmethod
+    def key(*, model, exportId=None, paramDict):
+        return (model, exportId, canonicalParameters(paramDict))
+
+class ShapeDiverSingleFlight:
+    """Coalescing of concurrent identical computations
+
+    The first caller computing a key (the leader) runs the computation, callers 
+    asking for the same key while it is in flight wait for it and share its result 
+    or exception. Nothing is kept once a computation has finished, use a result 
+    cache for that. Share one instance between sessions to coalesce computations 
+    of different sessions with the same model.
+    """
+
+    def __init__(self):
+        self.flights = {}
+        self.counters = {'computations': 0, 'coalesced': 0}
+        self.lock = threading.Lock()
+
+    def do(self, key, compute):
+        """Compute the result for a key unless it is in flight already, returns the result and whether it was shared"""
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = {'done': threading.Event(), 'result': None, 'error': None}
+                self.flights[key] = flight
+                self.counters['computations'] += 1
+            else:
+                self.counters['coalesced'] += 1
+        if not leader:
+            with instrumentation.span('coalesce'):
+                flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return (flight['result'], True)
+        try:
+            flight['result'] = compute()
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight['done'].set()
+        return (flight['result'], False)
+
+    def stats(self):
+        """Number of computations run, of calls which shared one in flight, and of computations in flight"""
+
+        with self.lock:
+            return dict(self.counters, inFlight=len(self.flights))
+
+class ShapeDiverDiskCache(ShapeDiverLruCache):
+    """LRU cache of files in a directory, within a byte budget and optional time-to-live
+
+    Files are stored under a name derived from the key. Entries are indexed in 
+    memory, the index is rebuilt from the directory on start (least recently used 
+    first, using the modification time), so that the cache survives restarts. 
+    Evicted and expired files are removed.
+    """
+
+    def __init__(self, *, directory, maxBytes=512 * 1024 * 1024, maxEntries=100000, ttl=None):
+        super().__init__(maxEntries=maxEntries, ttl=ttl, maxBytes=maxBytes)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for entry in os.scandir(directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        now = time.time()
+        for (mtime, name, size) in sorted(files):
+            remaining = ttl - (now - mtime) if ttl is not None else None
+            if remaining is not None and remaining <= 0:
+                self._removeFile(os.path.join(directory, name))
+                continue
+            super().put(name.split('.')[0], os.path.join(directory, name), size = size, ttl = remaining)
+
+    @staticmethod
+    def digest(key):
+        """Name of the file of a key, without file ending"""
+
+        return hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+
+    def get(self, key, default=None):
+        """Path of the cached file of a key, marking it as most recently used"""
+
+        digest = self.digest(key)
+        path = super().get(digest)
+        if path is None:
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            # removed by another process sharing the directory
+            super().pop(digest)
+            return default
+        return path
+
+    def put(self, key, path, *, fileEnding=None, ttl=None):
+        """Move a file into the cache, returns its new path
+
+        Files exceeding the byte budget are not cached, their path is returned unchanged.
+        """
+
+        size = os.path.getsize(path)
+        if self.maxBytes is not None and size > self.maxBytes:
+            return path
+        digest = self.digest(key)
+        target = os.path.join(self.directory, f'{digest}.{fileEnding}' if fileEnding is not None else digest)
+        source = path
+        if os.stat(path).st_dev != os.stat(self.directory).st_dev:
+            # different file system, copy to a temporary file first to replace atomically
+            (fd, source) = tempfile.mkstemp(suffix = '.tmp', dir = self.directory)
+            with os.fdopen(fd, 'wb') as file, open(path, 'rb') as original:
+                shutil.copyfileobj(original, file)
+            os.remove(path)
+        with self.lock:
+            previous = self.entries.get(digest)
+            if previous is not None:
+                # the file of the previous entry is replaced, unless its file ending differs
+                ShapeDiverLruCache._remove(self, digest)
+                if previous[0] != target:
+                    self._removeFile(previous[0])
+            os.replace(source, target)
+            self._insert(digest, target, size = size, ttl = ttl)
+        return target
+
+    def load(self, path, *, mode='file', href=None, contentType=None, start=None, cached=True):
+        """ShapeDiverDownload of a cached file, mapped read-only into memory (mode 'mmap') or read (mode 'memory')"""
+
+        size = os.path.getsize(path)
+        seconds = time.perf_counter() - start if start is not None else 0
+        if mode == 'file':
+            return ShapeDiverDownload(href = href, contentType = contentType, size = size, seconds = seconds, path = path, cached = cached)
+        with open(path, 'rb') as file:
+            buffer = (mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if mode == 'mmap' else file.read()) if size > 0 else b''
+        return ShapeDiverDownload(href = href, contentType = contentType, size = size, seconds = seconds, buffer = buffer, cached = cached)
+
+    def pop(self, key):
+        return super().pop(self.digest(key))
+
+    def clear(self):
+        """Remove all entries and their files"""
+
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
+
+    def _remove(self, key):
+        path = self.entries[key][0]
+        super()._remove(key)
+        self._removeFile(path)
+
+    def _removeFile(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+class ShapeDiverAssetCache(ShapeDiverDiskCache):
+    """Disk cache of output assets, keyed on output id, output version and content type
+
+    An output whose version hasn't changed has the same content, so its assets 
+    are served from the cache instead of being downloaded again.
+    """
+
+    def __init__(self, *, directory=None, maxBytes=512 * 1024 * 1024):
+        super().__init__(directory = directory if directory is not None else os.path.join(tempfile.gettempdir(), 'shapediver-assets'), maxBytes = maxBytes)
+
+    @staticmethod
+    def assetKey(response, item):
+        """Key of a content item of an output of a response, None if the output has no version"""
+
+        output = response.outputOfContentItem(item)
+        if output is None or output.get('version') is None:
+            return None
+        return (output['id'], output['version'], item.get('contentType'))
+
+    def download(self, response, items, *, mode='file'):
+        """Get the assets of output content items of a response, downloading only those not cached
+
+        Works like downloadAssets, downloads served from the cache are marked as cached.
+        """
+
+        if mode not in ('file', 'mmap', 'memory'):
+            raise Exception(f'Unknown download mode {mode}')
+        results = [None] * len(items)
+        missing = []
+        uncacheable = []
+        for (index, item) in enumerate(items):
+            key = self.assetKey(response, item)
+            path = self.get(key) if key is not None else None
+            if path is not None:
+                try:
+                    results[index] = self.load(path, mode = mode, href = item['href'], contentType = item.get('contentType'), start = time.perf_counter())
+                    continue
+                except OSError:
+                    # evicted in the meantime
+                    pass
+            if key is not None:
+                missing.append((index, key))
+            else:
+                uncacheable.append(index)
+        if len(missing) > 0:
+            start = time.perf_counter()
+            downloads = downloadAssets([items[index] for (index, _) in missing], mode = 'file')
+            for ((index, key), download) in zip(missing, downloads):
+                path = self.put(key, download.path, fileEnding = mapContentTypeToFileEnding(download.contentType))
+                results[index] = self.load(path, mode = mode, href = download.href, contentType = download.contentType, start = start, cached = False)
+        if len(uncacheable) > 0:
+            for (index, download) in zip(uncacheable, downloadAssets([items[index] for index in uncacheable], mode = mode)):
+                results[index] = download
+        return results
+
+class ShapeDiverExportCache(ShapeDiverDiskCache):
+    """Persistent disk cache of export artifacts, keyed on model, export id and hash of the canonical parameter values
+
+    Holds the asset of the first content item of an export. Artifacts are evicted 
+    when the byte budget is exceeded (least recently used first) and when they are 
+    older than ttl seconds. Used by ShapeDiverTinySessionSdk.compute, exports found 
+    in the cache are neither computed nor downloaded again.
+    """
+
+    def __init__(self, *, directory=None, maxBytes=256 * 1024 * 1024, ttl=86400):
+        super().__init__(directory = directory if directory is not None else os.path.join(tempfile.gettempdir(), 'shapediver-exports'), maxBytes = maxBytes, ttl = ttl)
+
+    @staticmethod
+    def key(*, model, exportId, paramDict):
+        return (model, exportId, hashlib.sha256(canonicalParameters(paramDict).encode()).hexdigest())
+
+class ShapeDiverSessionExpiredError(Exception):
+    """Raised if the backend does not know the session (anymore)"""
+
+"""HTTP status codes with which the backend answers requests for expired or unknown sessions"""
+sessionExpiredStatusCodes = (404, 410)
+
+"""Responses of sessions re-opened after expiry, keyed on the id of the expired session"""
+_reopenedSessions = ShapeDiverLruCache(maxEntries=1024, ttl=86400)
+_reopenLocks = {}
+_reopenLocksLock = threading.Lock()
+
+class ShapeDiverValidationError(Exception):
+    """Raised if parameter values do not match the parameter definitions of the model"""
+
+class ShapeDiverParameterValidator:
+    """Local validation of parameter values against the parameter definitions of a session
+
+    Checks types, ranges ('min' and 'max'), choices and Odd/Even constraints, and 
+    coerces values to the representation expected by the backend, rounding numbers 
+    to the allowed number of decimal places. Invalid values raise 
+    ShapeDiverValidationError before any request is sent, which is counted as
+    an avoided remote call.
+    """
+
+    colorPattern = re.compile(r'^(0x|#)?([0-9a-fA-F]{6}|[0-9a-fA-F]{8})$')
+
+    def __init__(self):
+        self.counters = {'validated': 0, 'avoidedCalls': 0}
+        self.lock = threading.Lock()
+
+    def validate(self, *, response, paramDict):
+        """Returns the coerced parameter values, values of unknown parameters are passed on unchanged"""
+
+        try:
+            result = {}
+            for (paramId, value) in paramDict.items():
+                paramDef = response.parameterById(paramId)
+                result[paramId] = self.validateValue(paramDef, value) if paramDef is not None else value
+        except ShapeDiverValidationError:
+            self._count('avoidedCalls')
+            raise
+        self._count('validated')
+        return result
+
+    def validateValue(self, paramDef, value):
+        """Validate and coerce the value of a single parameter"""
+
+        paramType = paramDef['type']
+        name = paramDef.get('displayname') or paramDef.get('name') or paramDef['id']
+        if paramType in ('Float', 'Int', 'Odd', 'Even'):
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not a number')
+            if paramType == 'Float':
+                number = round(number, paramDef.get('decimalplaces', 15))
+            else:
+                if not number.is_integer():
+                    raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not an integer')
+                number = int(number)
+                if paramType == 'Odd' and number % 2 != 1 or paramType == 'Even' and number % 2 != 0:
+                    raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not {paramType.lower()}')
+            if paramDef.get('min') is not None and number < paramDef['min'] or paramDef.get('max') is not None and number > paramDef['max']:
+                raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is outside of range [{paramDef.get("min")}, {paramDef.get("max")}]')
+            return number
+        if paramType == 'Bool':
+            if isinstance(value, bool):
+                return 'true' if value else 'false'
+            if str(value).lower() in ('true', 'false'):
+                return str(value).lower()
+            raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not a boolean')
+        if paramType == 'StringList':
+            choices = paramDef.get('choices', [])
+            indices = str(value).split(',')
+            if not all(index.strip().isdigit() and int(index) < len(choices) for index in indices):
+                raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not a valid choice')
+            return ','.join(str(int(index)) for index in indices)
+        if paramType == 'Color':
+            if not isinstance(value, str) or self.colorPattern.match(value) is None:
+                raise ShapeDiverValidationError(f'Value {value!r} of parameter {name} is not a color')
+            return value
+        if paramType == 'String':
+            if paramDef.get('max') is not None and len(str(value)) > paramDef['max']:
+                raise ShapeDiverValidationError(f'Value of parameter {name} is longer than {paramDef["max"]} characters')
+            return str(value)
+        return value
+
+    def stats(self):
+        """Counts of validated parameter sets and of rejected ones (avoided remote calls)"""
+
+        with self.lock:
+            return dict(self.counters)
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+class ShapeDiverParameterQuantizer:
+    """Canonicalisation of parameter values to the precision of the model
+
+    Rounds Float values to their 'decimalplaces', snapping values which exceed 'min' 
+    or 'max' by less than half a step back into the range. Int/Odd/Even values are 
+    only snapped to integers if they differ from one by less than the relative 
+    tolerance, larger deviations are left to validation. Values which only differ 
+    by numerical noise (e.g. 0.5000000001 and 0.5) thereby result in the same 
+    request, which increases cache hit rates. 
+
+    Counts how many distinct sets of parameter values were collapsed onto 
+    the key of a different set, remembering up to maxKeys keys.
+    """
+
+    def __init__(self, *, maxKeys=4096, tolerance=1e-9):
+        self.maxKeys = maxKeys
+        self.tolerance = tolerance
+        self.keys = OrderedDict()
+        self.quantizedKeys = {}
+        self.counters = {'quantized': 0, 'changedValues': 0, 'collapsedKeys': 0}
+        self.lock = threading.Lock()
+
+    def quantize(self, *, response, paramDict):
+        """Returns the quantized parameter values, values of other parameters are passed on unchanged"""
+
+        result = {}
+        changed = 0
+        for (paramId, value) in paramDict.items():
+            paramDef = response.parameterById(paramId)
+            result[paramId] = self.quantizeValue(paramDef, value) if paramDef is not None else value
+            if result[paramId] != value:
+                changed += 1
+        self._record(canonicalParameters(paramDict), canonicalParameters(result), changed)
+        return result
+
+    def quantizeValue(self, paramDef, value):
+        """Quantize the value of a single parameter"""
+
+        if paramDef['type'] not in ('Float', 'Int', 'Odd', 'Even') or isinstance(value, bool):
+            return value
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            # left to validation
+            return value
+        if paramDef['type'] != 'Float':
+            rounded = round(number)
+            if abs(number - rounded) > self.tolerance * max(1, abs(number)):
+                # left to validation
+                return value
+            return int(rounded)
+        decimalplaces = paramDef.get('decimalplaces', 15)
+        number = round(number, decimalplaces)
+        halfStep = 0.5 * 10 ** -decimalplaces
+        if paramDef.get('min') is not None and paramDef['min'] - halfStep <= number < paramDef['min']:
+            number = paramDef['min']
+        if paramDef.get('max') is not None and paramDef['max'] < number <= paramDef['max'] + halfStep:
+            number = paramDef['max']
+        # avoid negative zero
+        return number + 0.0
+
+    def stats(self):
+        """Counts of quantized parameter sets, changed values and collapsed keys"""
+
+        with self.lock:
+            return dict(self.counters, distinctKeys=len(self.keys))
+
+    def _record(self, key, quantizedKey, changed):
+        with self.lock:
+            self.counters['quantized'] += 1
+            self.counters['changedValues'] += changed
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                return
+            if quantizedKey in self.quantizedKeys:
+                self.counters['collapsedKeys'] += 1
+            self.keys[key] = quantizedKey
+            self.quantizedKeys[quantizedKey] = self.quantizedKeys.get(quantizedKey, 0) + 1
+            if len(self.keys) > self.maxKeys:
+                (_, evicted) = self.keys.popitem(last=False)
+                self.quantizedKeys[evicted] -= 1
+                if self.quantizedKeys[evicted] == 0:
+                    del self.quantizedKeys[evicted]
+
+"""Executor running the computations started by ShapeDiverTinySessionSdk.compute"""
+computeExecutor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='shapediver-compute')
+
+class ShapeDiverComputation:
+    """Outputs and exports of one parameter set, computed concurrently
+
+    Returned by ShapeDiverTinySessionSdk.compute. Accessing a result waits for its
+    computation only, so consumers of the outputs don't wait for the exports. 
+    Exceptions are passed to the exception handler of the session.
+    """
+
+    def __init__(self, *, sdk, paramDict, outputs, exports=None, exportKeys={}, cachedExports={}):
+        self.sdk = sdk
+        """Parameter values of the computation, prepared by the session"""
+        self.paramDict = paramDict
+        self.outputs = outputs
+        self.exports = exports
+        """Keys of the exports in the export cache of the session, and paths of the cached ones"""
+        self.exportKeys = exportKeys
+        self.cachedExports = cachedExports
+
+    def output(self):
+        """Response of the computation of all outputs"""
+
+        return self._result(self.outputs)
+
+    def export(self, exportId):
+        """Response containing the result of an export
+
+        Exports served from the export cache are computed on demand, using a session
+        leased from the pool if the session belongs to one.
+        """
+
+        if exportId in self.cachedExports:
+            future = computeExecutor.submit(instrumentation.bind(self._computeExport), exportId)
+        elif self.exports is None:
+            raise Exception(f'Export {exportId} has not been requested')
+        else:
+            future = self.exports
+        results = self._result(future)
+        # the exception handler may return something other than the results
+        return results[exportId] if isinstance(results, dict) else results
+
+    def exportAsset(self, exportId, *, mode='file'):
+        """ShapeDiverDownload of the first content item of an export, None if there is none
+
+        Served from the export cache of the session if it contains the export, without
+        any request. Otherwise the export is downloaded, and stored in the cache.
+        See downloadAssets for the modes.
+        """
+
+        start = time.perf_counter()
+        exportCache = self.sdk.exportCache
+        path = self.cachedExports.get(exportId)
+        if path is not None:
+            try:
+                return exportCache.load(path, mode = mode, contentType = mapFileEndingToContentType(ShapeDiverMimeRegistry.fileEndingOf(path)), start = start)
+            except OSError:
+                # evicted in the meantime
+                pass
+        items = self.export(exportId).exportContentItems()
+        if len(items) == 0:
+            return None
+        if exportCache is None:
+            return downloadAssets(items[:1], mode = mode)[0]
+        download = downloadAssets(items[:1], mode = 'file')[0]
+        path = exportCache.put(self.exportKeys[exportId], download.path, fileEnding = mapContentTypeToFileEnding(download.contentType))
+        return exportCache.load(path, mode = mode, href = download.href, contentType = download.contentType, start = start, cached = False)
+
+    def _computeExport(self, exportId):
+        if self.sdk.pool is None:
+            return self.sdk._exports(exportIds = [exportId], paramDict = self.paramDict, prepared = True)
+        # the session may have been returned to the pool already
+        with self.sdk.pool.lease() as sdk:
+            return sdk._exports(exportIds = [exportId], paramDict = self.paramDict, prepared = True)
+
+    def _result(self, future):
+        try:
+            return future.result()
+        except Exception as e:
+            if hasattr(self.sdk, 'exceptionHandler'):
+                return self.sdk.exceptionHandler(e)
+            raise
+
 def ExceptionHandler(func):
     """Decorator for activating the exception handler"""
     def decorate(*args, **kwargs):
@@ -220,7 +1604,7 @@ class ShapeDiverTinySessionSdk:
     """
 
     @ExceptionHandler
-    def __init__(self, *, modelViewUrl, ticket=None, sessionInitResponse=None, paramDict={}, exceptionHandler=None, parameterMapper=None):
+    def __init__(self, *, modelViewUrl, ticket=None, sessionInitResponse=None, paramDict={}, exceptionHandler=None, parameterMapper=None, transport=None, retryPolicy=None, resultCache=None, parameterValidator=None, parameterQuantizer=None, submitDelta=True, resultStore=None, singleFlight=None, exportCache=None):
         """Open a session with a ShapeDiver model
         
         Parameter values can optionally be included in the session init request.
@@ -229,14 +1613,63 @@ class ShapeDiverTinySessionSdk:
 
         self.modelViewUrl = modelViewUrl
 
+        """HTTP transport, shared by default with all sessions using the same modelViewUrl"""
+        self.transport = transport if transport is not None else httpTransport(modelViewUrl)
+
+        """Handling of rate limits and delayed computations"""
+        self.retryPolicy = retryPolicy if retryPolicy is not None else defaultRetryPolicy
+
+        """Optional ShapeDiverResultCache for results of outputs and exports"""
+        self.resultCache = resultCache
+
+        """Optional ShapeDiverParameterValidator applied to parameter values of outputs and exports"""
+        self.parameterValidator = parameterValidator
+
+        """Optional ShapeDiverParameterQuantizer applied to parameter values before caching and sending them"""
+        self.parameterQuantizer = parameterQuantizer
+
+        """Optional store recording every computation, see ShapeDiverTinySdkResultStore"""
+        self.resultStore = resultStore
+
+        """Optional ShapeDiverSingleFlight coalescing concurrent identical computations"""
+        self.singleFlight = singleFlight
+
+        """Optional ShapeDiverExportCache holding export artifacts, see compute"""
+        self.exportCache = exportCache
+
+        """Whether to omit parameter values which equal the default value from requests"""
+        self.submitDelta = submitDelta
+
+        """Canonical parameter values and response of the last computation of outputs (key None) and of each export"""
+        self.lastCommitted = {}
+        self.counters = {'duplicateRequests': 0, 'coalescedRequests': 0}
+
+        """Ticket the session was opened with, if known"""
+        self.ticket = ticket
+
+        """False after a transport failure, or if the session expired and could not be re-opened"""
+        self.healthy = True
+
+        """Pool the session belongs to, if any"""
+        self.pool = None
+
+        """Futures of the computations started by compute which are still running, see whenIdle"""
+        self.running = set()
+        self.idleCallbacks = []
+        self.runningLock = threading.Lock()
+
         if exceptionHandler is not None:
             self.exceptionHandler = exceptionHandler
       
         if parameterMapper is not None:
             self.parameterMapper = parameterMapper
       
-        if sessionInitResponse is not None:
+        if isinstance(sessionInitResponse, ShapeDiverResponse):
+            self.response = sessionInitResponse
+            self._followReopenedSession()
+        elif sessionInitResponse is not None:
             self.response = ShapeDiverResponse(sessionInitResponse)
+            self._followReopenedSession()
       
         elif ticket is not None:
             endpoint = f'{self.modelViewUrl}/api/v2/ticket/{ticket}'
@@ -244,14 +1677,9 @@ class ShapeDiverTinySessionSdk:
             headers = {
                 'Content-Type': 'application/json'
             }
-            response = requests.post(endpoint, data=jsonBody, headers=headers)
-            if response.status_code != 201:
-                raise Exception(f'Failed to open session (HTTP status code {response.status_code}): {response.text}')
-
-            # TODO: handle rate-limiting and delay
-
             """Parsed response of the session init request"""
-            self.response = ShapeDiverResponse(response.json())
+            self.response = self._request('POST', endpoint, data=jsonBody, headers=headers, 
+                expectedStatus=201, action='open session', idempotent=False)
         else:
             raise Exception('Expected (ticket and modelViewUrl) or (sessionInitResponse and modelViewUrl) to be provided')
 
@@ -263,9 +1691,10 @@ class ShapeDiverTinySessionSdk:
         """
 
         endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/close'
-        response = requests.post(endpoint);
-        if response.status_code != 200:
-            raise Exception(f'Failed to close session (HTTP status code {response.status_code}): {response.text}')
+        try:
+            self._request('POST', endpoint, action='close session', parse=False)
+        except ShapeDiverSessionExpiredError:
+            pass
 
     @ExceptionHandler
     @ParameterMapper
@@ -275,18 +1704,85 @@ class ShapeDiverTinySessionSdk:
         API documentation: https://sdr7euc1.eu-central-1.shapediver.com/api/v2/docs/#/output/put_api_v2_session__sessionId__output
         """
 
-        endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/output'
-        jsonBody = json.dumps(paramDict)
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        response = requests.put(endpoint, data=jsonBody, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f'Failed to compute outputs (HTTP status code {response.status_code}): {response.text}')
+        return self._output(paramDict = paramDict)
 
-        # TODO: handle rate-limiting and delay
+    @ExceptionHandler
+    @ParameterMapper
+    def compute(self, *, exportIds = (), paramDict = {}):
+        """Request the computation of all outputs and of exports concurrently
+
+        Parameter values are mapped and prepared once for both. Returns a 
+        ShapeDiverComputation right away, whose results are waited for when they are 
+        accessed. Exports whose artifacts are contained in the export cache are not computed.
+        """
+
+        prepared = self._prepareParameters(paramDict)
+        exportKeys = {}
+        cachedExports = {}
+        if self.exportCache is not None:
+            for exportId in exportIds:
+                exportKeys[exportId] = ShapeDiverExportCache.key(model = self.modelKey(), exportId = exportId, paramDict = prepared)
+                path = self.exportCache.get(exportKeys[exportId])
+                if path is not None:
+                    cachedExports[exportId] = path
+        missingIds = [exportId for exportId in exportIds if exportId not in cachedExports]
+        outputs = self._track(computeExecutor.submit(instrumentation.bind(self._output), paramDict = prepared, prepared = True))
+        exports = self._track(computeExecutor.submit(instrumentation.bind(self._exports), exportIds = missingIds, paramDict = prepared, prepared = True)) if len(missingIds) > 0 else None
+        return ShapeDiverComputation(sdk = self, paramDict = prepared, outputs = outputs, exports = exports, 
+            exportKeys = exportKeys, cachedExports = cachedExports)
+
+    def whenIdle(self, callback):
+        """Call callback once the computations started by compute have finished, right away if none is running"""
+
+        with self.runningLock:
+            if len(self.running) > 0:
+                self.idleCallbacks.append(callback)
+                return
+        callback()
+
+    def _track(self, future):
+        """Count a future of compute as running until it is done"""
+
+        with self.runningLock:
+            self.running.add(future)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future):
+        with self.runningLock:
+            self.running.discard(future)
+            if len(self.running) > 0:
+                return
+            (callbacks, self.idleCallbacks) = (self.idleCallbacks, [])
+        for callback in callbacks:
+            callback()
+
+    def _output(self, *, paramDict, prepared=False):
+        """Request the computation of all outputs, unless it is cached or has just been committed
+
+        prepared tells whether _prepareParameters has been applied to the parameter values already.
+        """
+
+        if not prepared:
+            paramDict = self._prepareParameters(paramDict)
+        canonical = canonicalParameters(paramDict)
+        last = self.lastCommitted.get(None)
+        if last is not None and last[0] == canonical:
+            self.counters['duplicateRequests'] += 1
+            return last[1]
 
-        return ShapeDiverResponse(response.json())
+        def compute():
+            endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/output'
+            jsonBody = json.dumps(paramDict)
+            headers = {
+                'Content-Type': 'application/json'
+            }
+            return self._request('PUT', endpoint, data=jsonBody, headers=headers, 
+                action='compute outputs', delay=lambda result: result.delay())
+
+        result = self._cached(exportId = None, paramDict = paramDict, compute = compute)
+        self.lastCommitted[None] = (canonical, result)
+        return result
 
     @ExceptionHandler
     @ParameterMapper
@@ -296,19 +1792,19 @@ class ShapeDiverTinySessionSdk:
         API documentation: https://sdr7euc1.eu-central-1.shapediver.com/api/v2/docs/#/export/put_api_v2_session__sessionId__export
         """
 
-        endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/export'
-        body = {'exports': [exportId], 'parameters': paramDict}
-        jsonBody = json.dumps(body)
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        response = requests.put(endpoint, data=jsonBody, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f'Failed to compute export (HTTP status code {response.status_code}): {response.text}')
+        return self._exports(exportIds = [exportId], paramDict = paramDict)[exportId]
+
+    @ExceptionHandler
+    @ParameterMapper
+    def exports(self, *, exportIds, paramDict = {}):
+        """Request several exports using a single computation
 
-        # TODO: handle rate-limiting and delay
+        Returns a dictionary mapping each export id to a response containing the 
+        result of this export.
+        API documentation: https://sdr7euc1.eu-central-1.shapediver.com/api/v2/docs/#/export/put_api_v2_session__sessionId__export
+        """
 
-        return ShapeDiverResponse(response.json())
+        return self._exports(exportIds = exportIds, paramDict = paramDict)
     
     @ExceptionHandler
     def requestFileUpload(self, *, requestBody = {}):
@@ -317,16 +1813,476 @@ class ShapeDiverTinySessionSdk:
         API documentation: https://sdr7euc1.eu-central-1.shapediver.com/api/v2/docs/#/file/post_api_v2_session__sessionId__file_upload
         """
 
-        endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/file/upload'
-        jsonBody = json.dumps(requestBody)
-        headers = {
-            'Content-Type': 'application/json'
-        }
-        response = requests.post(endpoint, data=jsonBody, headers=headers)
-        if response.status_code != 200:
-            raise Exception(f'Failed to request file upload (HTTP status code {response.status_code}): {response.text}')
+        def compute():
+            endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/file/upload'
+            jsonBody = json.dumps(requestBody)
+            headers = {
+                'Content-Type': 'application/json'
+            }
+            return self._request('POST', endpoint, data=jsonBody, headers=headers, action='request file upload')
+
+        return self._inSession(compute)
+
+    def ping(self):
+        """Check that the session works, re-opening it if it expired
+
+        Requests the default parameter values of the session. Raises an exception if 
+        the session does not work, the exception handler is not applied.
+        API documentation: https://sdr7euc1.eu-central-1.shapediver.com/api/v2/docs/#/session/get_api_v2_session__sessionId__default
+        """
+
+        def compute():
+            endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/default'
+            return self._request('GET', endpoint, action='check session', parse=False)
+
+        self._inSession(compute)
+
+    def modelKey(self):
+        """Identifier of the model used to key cached results"""
+
+        modelId = self.response.modelId()
+        if modelId is not None:
+            return modelId
+        if self.ticket is not None:
+            return self.ticket
+        return f'{self.modelViewUrl}/{self.response.sessionId()}'
+
+    def _cached(self, *, exportId, paramDict, compute):
+        """Serve a result from the result cache, or compute and cache it"""
+
+        key = ShapeDiverResultCache.key(model = self.modelKey(), exportId = exportId, paramDict = paramDict)
+        if self.resultCache is not None:
+            result = self.resultCache.get(key)
+            if result is not None:
+                return result
+
+        def computeAndCache():
+            result = self._computeAndRecord(compute, paramDict = paramDict)
+            if self.resultCache is not None:
+                self.resultCache.put(key, result)
+            return result
+
+        return self._coalesced(key, computeAndCache)
+
+    def _coalesced(self, key, compute):
+        """Compute, sharing the computation with concurrent identical ones if single-flight is configured"""
+
+        if self.singleFlight is None:
+            return compute()
+        (result, shared) = self.singleFlight.do(key, compute)
+        if shared:
+            self.counters['coalescedRequests'] += 1
+        return result
+
+    def _prepareParameters(self, paramDict):
+        """Quantize and validate parameter values locally if configured, and reduce them to the delta to the defaults
+
+        The backend uses the default value for every parameter not contained in a 
+        request, therefore only values differing from the defaults need to be sent.
+        """
+
+        if self.parameterQuantizer is not None:
+            paramDict = self.parameterQuantizer.quantize(response = self.response, paramDict = paramDict)
+        if self.parameterValidator is not None:
+            paramDict = self.parameterValidator.validate(response = self.response, paramDict = paramDict)
+        if self.submitDelta:
+            defaults = self.response.defaultParameterValues()
+            paramDict = {paramId: value for (paramId, value) in paramDict.items() 
+                if paramId not in defaults or defaults[paramId] is None or canonicalParameterValue(value) != canonicalParameterValue(defaults[paramId])}
+        return paramDict
+
+    def _exports(self, *, exportIds, paramDict, prepared=False):
+        """Request exports which are not cached yet in one request, split the result by export id
+
+        prepared tells whether _prepareParameters has been applied to the parameter values already.
+        """
+
+        if not prepared:
+            paramDict = self._prepareParameters(paramDict)
+        canonical = canonicalParameters(paramDict)
+        results = {}
+        keys = {}
+        for exportId in exportIds:
+            last = self.lastCommitted.get(exportId)
+            if last is not None and last[0] == canonical:
+                self.counters['duplicateRequests'] += 1
+                results[exportId] = last[1]
+            elif self.resultCache is not None:
+                keys[exportId] = ShapeDiverResultCache.key(model = self.modelKey(), exportId = exportId, paramDict = paramDict)
+                result = self.resultCache.get(keys[exportId])
+                if result is not None:
+                    results[exportId] = result
+        missingIds = [exportId for exportId in dict.fromkeys(exportIds) if exportId not in results]
+        if len(missingIds) == 0:
+            return results
+
+        def compute():
+            endpoint = f'{self.modelViewUrl}/api/v2/session/{self.response.sessionId()}/export'
+            body = {'exports': missingIds, 'parameters': paramDict}
+            jsonBody = json.dumps(body)
+            headers = {
+                'Content-Type': 'application/json'
+            }
+            return self._request('PUT', endpoint, data=jsonBody, headers=headers, 
+                action='compute export', delay=lambda result: result.delay(exportIds = missingIds))
+
+        def computeAndCache():
+            response = self._computeAndRecord(compute, paramDict = paramDict, exportIds = missingIds).response
+            computed = {}
+            for exportId in missingIds:
+                if exportId not in response.get('exports', {}):
+                    raise Exception(f'Failed to compute export, result for export {exportId} is missing')
+                computed[exportId] = ShapeDiverResponse(dict(response, exports = {exportId: response['exports'][exportId]}))
+                if self.resultCache is not None:
+                    self.resultCache.put(keys[exportId], computed[exportId])
+            return computed
+
+        # concurrent requests for the same set of exports share one computation
+        results.update(self._coalesced((self.modelKey(), tuple(sorted(missingIds)), canonical), computeAndCache))
+        for exportId in exportIds:
+            self.lastCommitted[exportId] = (canonical, results[exportId])
+        return results
+
+    def _computeAndRecord(self, compute, *, paramDict, exportIds=None):
+        """Run a computation in the session, recording it in the result store if configured"""
+
+        start = time.perf_counter()
+        result = self._inSession(compute)
+        if self.resultStore is not None:
+            self.resultStore.record(kind = 'output' if exportIds is None else 'export', model = self.modelKey(), 
+                paramDict = self.response.effectiveParameterValues(paramDict), 
+                response = result, seconds = time.perf_counter() - start, exportIds = exportIds)
+        return result
+
+    def _inSession(self, compute):
+        """Run a request against the session, re-opening the session and replaying the request once if it expired"""
+
+        self._followReopenedSession()
+        try:
+            return compute()
+        except ShapeDiverSessionExpiredError:
+            self._reopen(self.response.sessionId())
+            return compute()
+
+    def _followReopenedSession(self):
+        """Switch to the session which replaced this one, in case it has been re-opened by another instance"""
+
+        response = _reopenedSessions.get(self.response.sessionId())
+        while response is not None:
+            self.response = response
+            response = _reopenedSessions.get(response.sessionId())
+
+    def _reopen(self, expiredSessionId):
+        """Re-open an expired session from the ticket
+        
+        Only one instance re-opens a specific expired session, others wait for it 
+        and use the same new session.
+        """
+
+        if self.ticket is None:
+            raise Exception('Session expired, can not re-open it because the ticket is unknown')
+        with _reopenLocksLock:
+            lock = _reopenLocks.setdefault(expiredSessionId, threading.Lock())
+        with lock:
+            response = _reopenedSessions.get(expiredSessionId)
+            if response is None:
+                endpoint = f'{self.modelViewUrl}/api/v2/ticket/{self.ticket}'
+                headers = {
+                    'Content-Type': 'application/json'
+                }
+                response = self._request('POST', endpoint, data='{}', headers=headers, 
+                    expectedStatus=201, action='re-open session', idempotent=False)
+                _reopenedSessions.put(expiredSessionId, response)
+        with _reopenLocksLock:
+            if _reopenLocks.get(expiredSessionId) is lock:
+                del _reopenLocks[expiredSessionId]
+        self.response = response
+        self.healthy = True
+
+    def _request(self, method, endpoint, *, data=None, headers=None, expectedStatus=200, action, parse=True, delay=None, idempotent=True):
+        """Send a request, retrying it according to the retry policy
+
+        Rate-limited requests are resent after the time requested by the backend.
+        If delay is given, it is called with the parsed response and returns the delay 
+        in milliseconds reported for a computation which is not finished yet, in which 
+        case the request is resent to poll for the result. Requests which are not
+        idempotent are only resent if rate-limited.
+
+        The request including retries is measured as span 'request', every HTTP call
+        as span 'http'. Transport failures and expiry mark the session as unhealthy.
+        """
+
+        with instrumentation.span('request', action=action) as span:
+            span.set(endpoint = endpoint)
+            try:
+                return self._retry(method, endpoint, data=data, headers=headers, expectedStatus=expectedStatus, action=action, parse=parse, delay=delay, idempotent=idempotent, span=span)
+            except (ShapeDiverSessionExpiredError, requests.RequestException):
+                self.healthy = False
+                raise
+
+    def _retry(self, method, endpoint, *, data, headers, expectedStatus, action, parse, delay, idempotent, span):
+        policy = self.retryPolicy
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            span.set(attempts = attempt + 1)
+            response = self._send(method, endpoint, data=data, headers=headers, action=action)
+            if response.status_code == expectedStatus:
+                if not parse:
+                    return response
+                result = ShapeDiverResponse(response.content)
+                pending = delay(result) if delay is not None else None
+                if pending is None:
+                    return result
+                reason = 'delay'
+                wait = policy.delayWait(pending, attempt)
+            elif policy.retryable(response.status_code, idempotent=idempotent):
+                reason = 'rateLimit' if response.status_code == 429 else 'status'
+                wait = policy.retryAfter(response)
+                if wait is None:
+                    wait = policy.backoff(attempt)
+            elif response.status_code in sessionExpiredStatusCodes and '/api/v2/session/' in endpoint:
+                raise ShapeDiverSessionExpiredError(f'Failed to {action}, session expired (HTTP status code {response.status_code}): {response.text}')
+            else:
+                raise Exception(f'Failed to {action} (HTTP status code {response.status_code}): {response.text}')
+
+            elapsed = time.monotonic() - start
+            if attempt >= policy.maxRetries or elapsed + wait > policy.deadline:
+                raise Exception(f'Failed to {action} within {policy.deadline} seconds after {attempt} retries (last HTTP status code {response.status_code})')
+            attempt += 1
+            policy.report({'action': action, 'reason': reason, 'statusCode': response.status_code, 
+                'attempt': attempt, 'wait': wait, 'elapsed': elapsed})
+            time.sleep(wait)
+
+    def _send(self, method, endpoint, *, data, headers, action):
+        """Send a single HTTP request, measured as span 'http'"""
+
+        with instrumentation.span('http', action=action, method=method) as span:
+            response = self.transport.request(method, endpoint, data=data, headers=headers)
+            span.label(status = str(response.status_code))
+            span.set(endpoint = endpoint, requestBytes = len(data) if data is not None else 0, responseBytes = len(response.content))
+            return response
+
+class ShapeDiverSessionPool:
+    """Pool of warm sessions with a ShapeDiver model
+
+    Sessions are leased for the duration of a request and returned to the pool
+    afterwards. A background thread keeps at least minSessions idle sessions open,
+    so that requests don't need to wait for a session to be opened, and closes 
+    sessions which have been idle for longer than maxIdle seconds or are older than 
+    maxAge seconds. Sessions are only pre-warmed after a successful lease, until no
+    session has been leased for maxIdle seconds or opening a session failed. Idle sessions which haven't been used for healthCheckInterval 
+    seconds are probed (see ShapeDiverTinySessionSdk.ping), which re-opens expired 
+    ones. At no time more than maxSessions sessions are open, requests exceeding 
+    this wait up to leaseTimeout seconds for a session to be returned.
+
+    Further keyword arguments are passed to ShapeDiverTinySessionSdk.
+    """
+
+    def __init__(self, *, ticket, modelViewUrl, minSessions=1, maxSessions=4, maxIdle=600, maxAge=3600, leaseTimeout=60, healthCheckInterval=30, **sdkOptions):
+        self.ticket = ticket
+        self.modelViewUrl = modelViewUrl
+        self.minSessions = minSessions
+        self.maxSessions = maxSessions
+        self.maxIdle = maxIdle
+        self.maxAge = maxAge
+        self.leaseTimeout = leaseTimeout
+        self.healthCheckInterval = healthCheckInterval
+        self.sdkOptions = sdkOptions
+        """Idle sessions as tuples (sdk, time opened, time returned), most recently returned last"""
+        self.idle = deque()
+        self.opened = {}
+        """Time each session was last known to work, by being opened, used or probed"""
+        self.checked = {}
+        self.opening = 0
+        """Time of the last successful lease, None before it and after failures to open a session"""
+        self.leased = None
+        self.closed = False
+        self.counters = {'leases': 0, 'waits': 0, 'opened': 0, 'closed': 0, 'failures': 0, 'probes': 0, 'probeFailures': 0}
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._maintain, name='shapediver-session-pool', daemon=True)
+        self.thread.start()
+
+    @contextmanager
+    def lease(self, *, timeout=None):
+        """Lease a session for the duration of a with statement
+
+        Computations started using compute keep the session leased until they have
+        finished, so that a session never runs computations of several leases.
+        Sessions are closed instead of being returned to the pool if they became
+        unhealthy (see ShapeDiverTinySessionSdk.healthy). Other exceptions, like 
+        those for invalid parameter values, keep the session warm.
+        """
+
+        sdk = self.acquire(timeout = timeout)
+        try:
+            yield sdk
+        finally:
+            sdk.whenIdle(lambda: self.release(sdk))
+
+    def acquire(self, *, timeout=None):
+        """Take a session from the pool, opening one if none is idle and the limit allows it"""
+
+        deadline = time.monotonic() + (timeout if timeout is not None else self.leaseTimeout)
+        with self.condition:
+            self.counters['leases'] += 1
+            waiting = False
+            while True:
+                while len(self.idle) > 0:
+                    (sdk, opened, returned) = self.idle.pop()
+                    if self._healthy(opened, returned):
+                        self.leased = time.monotonic()
+                        self.condition.notify_all()
+                        return sdk
+                    self._discard(sdk)
+                if len(self.opened) + self.opening < self.maxSessions:
+                    self.opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception(f'No session available within {timeout if timeout is not None else self.leaseTimeout} seconds (maximum of {self.maxSessions} sessions in use)')
+                if not waiting:
+                    waiting = True
+                    self.counters['waits'] += 1
+                self.condition.wait(remaining)
+        sdk = self._open()
+        with self.condition:
+            self.leased = time.monotonic()
+        return sdk
+
+    def release(self, sdk, *, discard=False):
+        """Return a leased session to the pool, or close it if discard is True or it is unhealthy"""
+
+        with self.condition:
+            if sdk not in self.opened:
+                return
+            if discard or self.closed or not sdk.healthy or not self._healthy(self.opened[sdk], time.monotonic()):
+                self._discard(sdk)
+            else:
+                self.checked[sdk] = time.monotonic()
+                self.idle.append((sdk, self.opened[sdk], time.monotonic()))
+            self.condition.notify_all()
+
+    def close(self):
+        """Close all idle sessions and stop maintaining the pool
+        
+        Leased sessions are closed when they are returned.
+        """
+
+        with self.condition:
+            self.closed = True
+            while len(self.idle) > 0:
+                self._discard(self.idle.pop()[0])
+            self.condition.notify_all()
+
+    def stats(self):
+        """Counters of leases, waits for a session, opened, closed and failed sessions, probes, and current pool state"""
+
+        with self.condition:
+            return dict(self.counters, idle=len(self.idle), open=len(self.opened), opening=self.opening)
+
+    def _healthy(self, opened, returned):
+        now = time.monotonic()
+        return now - opened < self.maxAge and now - returned < self.maxIdle
+
+    def _open(self):
+        """Open a session, a slot for which has been reserved by incrementing self.opening"""
+
+        try:
+            sdk = ShapeDiverTinySessionSdk(ticket = self.ticket, modelViewUrl = self.modelViewUrl, **self.sdkOptions)
+        except BaseException:
+            with self.condition:
+                self.opening -= 1
+                self.leased = None
+                self.counters['failures'] += 1
+                self.condition.notify_all()
+            raise
+        sdk.pool = self
+        with self.condition:
+            self.opening -= 1
+            self.opened[sdk] = time.monotonic()
+            self.checked[sdk] = self.opened[sdk]
+            self.counters['opened'] += 1
+        return sdk
+
+    def _discard(self, sdk):
+        """Forget about a session and close it in the background, called with the lock held"""
+
+        self.opened.pop(sdk, None)
+        self.checked.pop(sdk, None)
+        self.counters['closed'] += 1
+        threading.Thread(target=self._close, args=(sdk,), daemon=True).start()
+
+    def _close(self, sdk):
+        try:
+            sdk.close()
+        except Exception:
+            pass
+
+    def _probe(self):
+        """Probe idle sessions which haven't been checked for healthCheckInterval seconds, closing those which fail"""
+
+        with self.condition:
+            now = time.monotonic()
+            unchecked = [entry for entry in self.idle if now - self.checked.get(entry[0], 0) >= self.healthCheckInterval]
+            # probed sessions can't be leased meanwhile
+            for entry in unchecked:
+                self.idle.remove(entry)
+        for entry in unchecked:
+            sdk = entry[0]
+            try:
+                sdk.ping()
+            except Exception:
+                sdk.healthy = False
+            with self.condition:
+                self.counters['probes'] += 1
+                if sdk.healthy and not self.closed:
+                    self.checked[sdk] = time.monotonic()
+                    self.idle.appendleft(entry)
+                else:
+                    self.counters['probeFailures'] += 1
+                    self._discard(sdk)
+                self.condition.notify_all()
+
+    def _maintain(self):
+        """Background thread probing and closing unhealthy idle sessions, and pre-warming new ones"""
+
+        while True:
+            self._probe()
+            with self.condition:
+                if self.closed:
+                    return
+                for entry in [entry for entry in self.idle if not self._healthy(entry[1], entry[2])]:
+                    self.idle.remove(entry)
+                    self._discard(entry[0])
+                missing = min(self.minSessions - len(self.idle) - self.opening, self.maxSessions - len(self.opened) - self.opening)
+                if self.leased is None or time.monotonic() - self.leased >= self.maxIdle:
+                    missing = 0
+                if missing > 0:
+                    self.opening += 1
+            if missing > 0:
+                try:
+                    self.release(self._open())
+                except Exception:
+                    # failures are counted and stop pre-warming until the next successful lease
+                    missing = 0
+            if missing <= 1:
+                with self.condition:
+                    if not self.closed:
+                        self.condition.wait(self.healthCheckInterval)
+
+class ShapeDiverSessionPoolCache(ShapeDiverLruCache):
+    """LRU cache of session pools, pools are closed when they are evicted or removed"""
+
+    def __init__(self, *, maxEntries=8):
+        super().__init__(maxEntries=maxEntries)
 
-        # TODO: handle rate-limiting and delay
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self._remove(key)
 
-        return ShapeDiverResponse(response.json())
-    
\ No newline at end of file
+    def _remove(self, key):
+        pool = self.entries[key][0]
+        super()._remove(key)
+        pool.close()
@@ -0,0 +1,110 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverComputation, instrumentation
+
+"""Executor used by async sessions which do not specify their own one
+
+Its number of workers bounds the number of requests in flight at any time.
+"""
+defaultExecutor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='shapediver')
+
+class AsyncShapeDiverSessionSdk:
+    """Asyncio version of ShapeDiverTinySessionSdk
+
+    Requests run on an executor using the shared pooled transport, so that sessions,
+    computations and file uploads of many sessions can overlap on one event loop.
+    Exception handler and parameter mapper are applied exactly like for
+    ShapeDiverTinySessionSdk, which also serves as the synchronous facade (see sync).
+    Responses are parsed once they have been received, therefore their accessors
+    can be used without blocking the event loop.
+
+    Use AsyncShapeDiverSessionSdk.open to create a session.
+    """
+
+    def __init__(self, sdk, *, executor=None):
+        self.sdk = sdk
+        self.executor = executor if executor is not None else defaultExecutor
+
+    @property
+    def response(self):
+        """Parsed response of the session init request"""
+
+        return self.sdk.response
+
+    @classmethod
+    async def open(cls, *, executor=None, **sdkOptions):
+        """Open a session with a ShapeDiver model
+
+        Takes the same keyword arguments as ShapeDiverTinySessionSdk.
+        """
+
+        executor = executor if executor is not None else defaultExecutor
+        init = partial(ShapeDiverTinySessionSdk, **sdkOptions)
+        sdk = await asyncio.get_running_loop().run_in_executor(executor, instrumentation.bind(init))
+        return cls(sdk, executor = executor)
+
+    def sync(self):
+        """Synchronous facade of this session, sharing its session and hooks"""
+
+        return self.sdk
+
+    async def close(self):
+        """Close the session"""
+
+        await self._run(self.sdk.close)
+
+    async def output(self, *, paramDict = {}):
+        """Request the computation of all outputs"""
+
+        return await self._run(self.sdk.output, paramDict = paramDict)
+
+    async def export(self, *, exportId, paramDict = {}):
+        """Request an export"""
+
+        return await self._run(self.sdk.export, exportId = exportId, paramDict = paramDict)
+
+    async def exports(self, *, exportIds, paramDict = {}):
+        """Request several exports using a single computation, returns a dictionary of responses by export id"""
+
+        return await self._run(self.sdk.exports, exportIds = exportIds, paramDict = paramDict)
+
+    async def compute(self, *, exportIds = (), paramDict = {}):
+        """Request the computation of all outputs and of exports concurrently, returns an AsyncShapeDiverComputation"""
+
+        computation = await self._run(self.sdk.compute, exportIds = exportIds, paramDict = paramDict)
+        # the exception handler may return something other than a computation
+        return AsyncShapeDiverComputation(computation, executor = self.executor) if isinstance(computation, ShapeDiverComputation) else computation
+
+    async def requestFileUpload(self, *, requestBody = {}):
+        """Request the upload of a file for a parameter of type 'File'"""
+
+        return await self._run(self.sdk.requestFileUpload, requestBody = requestBody)
+
+    async def _run(self, func, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, instrumentation.bind(partial(func, **kwargs)))
+
+class AsyncShapeDiverComputation:
+    """Asyncio version of ShapeDiverComputation, see AsyncShapeDiverSessionSdk.compute"""
+
+    def __init__(self, computation, *, executor):
+        self.computation = computation
+        self.executor = executor
+
+    async def output(self):
+        """Response of the computation of all outputs"""
+
+        return await self._run(self.computation.output)
+
+    async def export(self, exportId):
+        """Response containing the result of an export"""
+
+        return await self._run(self.computation.export, exportId)
+
+    async def exportAsset(self, exportId, *, mode='file'):
+        """ShapeDiverDownload of the first content item of an export, None if there is none"""
+
+        return await self._run(partial(self.computation.exportAsset, mode = mode), exportId)
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, instrumentation.bind(partial(func, *args)))
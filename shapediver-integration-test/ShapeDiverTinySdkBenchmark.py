@@ -0,0 +1,233 @@
+"""Benchmarks of ShapeDiverTinySdk against a local ShapeDiverApiEmulator
+
+Measures latency percentiles, throughput and memory allocated per call of the hot
+paths of the SDK, and compares them to a baseline saved by an earlier run:
+
+    python ShapeDiverTinySdkBenchmark.py --save baseline.json
+    python ShapeDiverTinySdkBenchmark.py --baseline baseline.json
+
+The emulator runs in a separate process, so that neither its CPU time nor its
+allocations are attributed to the SDK. Exits with status 1 if a benchmark regressed
+by more than the tolerance compared to the baseline.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverResponse, ShapeDiverRetryPolicy
+from ShapeDiverTinySdkEmulator import ShapeDiverApiEmulator
+
+"""Metrics compared to the baseline, and whether higher values are better"""
+comparedMetrics = {'p50': False, 'p95': False, 'p99': False, 'throughput': True, 'allocatedBytes': False}
+
+def percentile(sortedValues, fraction):
+    """Nearest-rank percentile of sorted values"""
+
+    if len(sortedValues) == 0:
+        return None
+    return sortedValues[max(0, math.ceil(fraction * len(sortedValues)) - 1)]
+
+def measure(func, *, iterations, warmup=5, allocationIterations=20):
+    """Call func repeatedly, returns latency percentiles (seconds), throughput (calls per second) and allocations
+
+    func is called with the number of the iteration. allocatedBytes is the mean peak of
+    memory allocated during a call, retainedBytes the mean of memory still allocated
+    after it, both measured using tracemalloc in separate iterations.
+    """
+
+    for i in range(warmup):
+        func(i)
+    latencies = []
+    start = time.perf_counter()
+    for i in range(iterations):
+        callStart = time.perf_counter()
+        func(warmup + i)
+        latencies.append(time.perf_counter() - callStart)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for i in range(allocationIterations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func(warmup + iterations + i)
+            (current, peak) = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50': percentile(latencies, 0.50),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'throughput': iterations / elapsed if elapsed > 0 else None,
+        'allocatedBytes': sum(peaks) / len(peaks) if len(peaks) > 0 else None,
+        'retainedBytes': sum(retained) / len(retained) if len(retained) > 0 else None,
+    }
+
+def serveEmulator(options, addresses):
+    """Run an emulator in this process until it is terminated, puts its URL and ticket on the queue addresses"""
+
+    emulator = ShapeDiverApiEmulator(**options)
+    addresses.put((emulator.start(), emulator.ticket))
+    while True:
+        time.sleep(3600)
+
+class EmulatorProcess:
+    """ShapeDiverApiEmulator running in a child process, for use in a with statement"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.process = None
+        self.url = None
+        self.ticket = None
+
+    def __enter__(self):
+        addresses = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=serveEmulator, args=(self.options, addresses), daemon=True)
+        self.process.start()
+        (self.url, self.ticket) = addresses.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join()
+
+def varied(i):
+    """Parameter values of the emulated model, different for every iteration"""
+
+    return {'p-length': round(1 + (i % 9900) / 100, 2), 'p-count': 1 + i % 20, 'p-closed': 'true' if i % 2 else 'false'}
+
+def benchmarks(emulator, *, iterations):
+    """Run all benchmarks against an emulator, returns results by benchmark name"""
+
+    results = {}
+    url = emulator.url
+    ticket = emulator.ticket
+
+    def sessionInit(i):
+        ShapeDiverTinySessionSdk(ticket = ticket, modelViewUrl = url).close()
+    results['sessionInit'] = measure(sessionInit, iterations = iterations)
+
+    sdk = ShapeDiverTinySessionSdk(ticket = ticket, modelViewUrl = url)
+    results['output'] = measure(lambda i: sdk.output(paramDict = varied(i)), iterations = iterations)
+    results['outputRepeated'] = measure(lambda i: sdk.output(paramDict = varied(0)), iterations = iterations)
+    results['exports'] = measure(lambda i: sdk.exports(exportIds = ['e-png', 'e-pdf'], paramDict = varied(i)), iterations = iterations)
+
+    responseJson = json.dumps(sdk.output(paramDict = varied(0)).response)
+    def responseAccessors(i):
+        response = ShapeDiverResponse(responseJson)
+        response.parameterByName('Length')
+        response.parameterByDisplayname('Count')
+        response.outputByName('Mass')
+        response.outputContentItemsGltf2()
+        response.delay()
+    results['responseAccessors'] = measure(responseAccessors, iterations = iterations * 10)
+    sdk.close()
+
+    # the VIKTOR utils are optional, they require the viktor package
+    try:
+        from viktor import Color, File
+        import ShapeDiverTinySdkViktorUtils as utils
+    except ImportError:
+        return results
+
+    sdk = ShapeDiverTinySessionSdk(ticket = ticket, modelViewUrl = url)
+    responseJson = json.dumps(sdk.response.response)
+    values = {'Length': 12.5, 'Count': 7.0, 'Closed': True, 'Profile': 2, 'Color': Color(10, 20, 30), 'Label': 'truss'}
+    results['parameterMapper'] = measure(lambda i: utils.parameterMapper(paramDict = values, sdk = sdk), iterations = iterations * 10)
+
+    def fileUpload(i):
+        # a new file every iteration, so that the upload cache doesn't apply
+        value = SimpleNamespace(file = File.from_data(f'x,y\n{i},{i}\n'.encode() * 1024), filename = 'points.csv')
+        utils.parameterMapper(paramDict = {'File': value}, sdk = sdk)
+    results['fileUpload'] = measure(fileUpload, iterations = iterations)
+    sdk.close()
+
+    # VIKTOR's memoize only caches within a VIKTOR job, measure what happens once it returned the JSON string
+    def memoizedSession(i):
+        ShapeDiverTinySessionSdk(sessionInitResponse = utils.parseSessionInitResponse(responseJson), modelViewUrl = url, ticket = ticket)
+    results['memoizedSession'] = measure(memoizedSession, iterations = iterations * 10)
+    return results
+
+def faultBenchmarks(emulator, *, iterations):
+    """Run the computation benchmarks against an emulator injecting rate limits and delays"""
+
+    policy = ShapeDiverRetryPolicy(jitter = 0)
+    sdk = ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url, retryPolicy = policy)
+    results = {
+        'outputWithFaults': measure(lambda i: sdk.output(paramDict = varied(i)), iterations = iterations),
+        'exportsWithFaults': measure(lambda i: sdk.exports(exportIds = ['e-png', 'e-pdf'], paramDict = varied(i)), iterations = iterations),
+    }
+    sdk.close()
+    return results
+
+def compare(results, baseline, *, tolerance):
+    """Compare results to a baseline, returns the list of regressions exceeding the tolerance"""
+
+    regressions = []
+    for (name, result) in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for (metric, higherIsBetter) in comparedMetrics.items():
+            (value, referenceValue) = (result.get(metric), reference.get(metric))
+            if value is None or not referenceValue:
+                continue
+            change = value / referenceValue - 1
+            result.setdefault('change', {})[metric] = change
+            if (-change if higherIsBetter else change) > tolerance:
+                regressions.append(f'{name} {metric}: {referenceValue:.6g} -> {value:.6g} ({change:+.1%})')
+    return regressions
+
+def report(results):
+    """Format results as a table"""
+
+    lines = [f'{"benchmark":<20}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"calls/s":>10}{"alloc KiB":>11}{"retained":>10}']
+    for (name, result) in results.items():
+        lines.append(f'{name:<20}{result["p50"] * 1000:>10.3f}{result["p95"] * 1000:>10.3f}{result["p99"] * 1000:>10.3f}'
+            f'{result["throughput"]:>10.1f}{result["allocatedBytes"] / 1024:>11.1f}{result["retainedBytes"] / 1024:>10.1f}')
+    return '\n'.join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ShapeDiverTinySdk against a local emulator of the ShapeDiver API')
+    parser.add_argument('--iterations', type=int, default=200, help='number of measured calls per benchmark')
+    parser.add_argument('--latency', type=float, default=0, help='emulated network latency per request in seconds')
+    parser.add_argument('--compute-latency', type=float, default=0, help='emulated computation time in seconds')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.1, help='fraction of computations rate limited in the fault benchmarks')
+    parser.add_argument('--delay-rate', type=float, default=0.1, help='fraction of computations delayed in the fault benchmarks')
+    parser.add_argument('--baseline', help='JSON file of results to compare to')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change of a metric considered a regression')
+    parser.add_argument('--save', help='JSON file to save the results to')
+    args = parser.parse_args(argv)
+
+    options = {'latency': args.latency, 'computeLatency': args.compute_latency}
+    with EmulatorProcess(**options) as emulator:
+        results = benchmarks(emulator, iterations = args.iterations)
+    with EmulatorProcess(**options, rateLimitRate = args.rate_limit_rate, delayRate = args.delay_rate) as emulator:
+        results.update(faultBenchmarks(emulator, iterations = args.iterations))
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), tolerance = args.tolerance)
+    print(report(results))
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    for regression in regressions:
+        print(f'Regression: {regression}')
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
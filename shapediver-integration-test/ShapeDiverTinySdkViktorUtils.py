@@ -1,8 +1,66 @@
 from viktor.utils import memoize
 from viktor import UserError, UserMessage
-from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, RgbToShapeDiverColor, mapFileEndingToContentType
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverResponse, ShapeDiverSessionPool, ShapeDiverSessionPoolCache, ShapeDiverResultCache, ShapeDiverLruCache, ShapeDiverParameterValidator, ShapeDiverParameterQuantizer, ShapeDiverSingleFlight, ShapeDiverAssetCache, ShapeDiverExportCache, RgbToShapeDiverColor, mimeRegistry, httpTransport, instrumentation, ShapeDiverHistogramRegistry, ShapeDiverLogTracer
+from ShapeDiverTinySdkSweep import ShapeDiverSweep, parameterGrid
+from ShapeDiverTinySdkResultStore import ShapeDiverResultStore
+import functools
+import hashlib
 import json
-import requests
+import os
+import tempfile
+import threading
+
+"""Histograms of the durations and sizes measured by the instrumentation of this worker
+
+Use metrics.prometheus() to export them in the Prometheus text format.
+"""
+metrics = ShapeDiverHistogramRegistry()
+instrumentation.addSink(metrics)
+
+"""Log every measured span as JSON (logger 'shapediver.trace') if SD_TRACE is set"""
+if os.getenv('SD_TRACE'):
+    instrumentation.addSink(ShapeDiverLogTracer())
+
+"""Results of outputs and exports, shared by all sessions of this worker"""
+resultCache = ShapeDiverResultCache()
+
+"""Coalescing of concurrent identical computations of all sessions of this worker"""
+singleFlight = ShapeDiverSingleFlight()
+
+"""Output assets of this worker, unchanged outputs are served from it without a download"""
+outputAssetCache = ShapeDiverAssetCache()
+
+"""Export artifacts of this worker, kept on disk across restarts"""
+exportCache = ShapeDiverExportCache()
+
+"""Record of all computations of this worker, persisted in directory SD_RESULT_STORE_PATH, None if it is not set"""
+resultStore = ShapeDiverResultStore(path = os.getenv('SD_RESULT_STORE_PATH')) if os.getenv('SD_RESULT_STORE_PATH') else None
+
+"""Local validation of parameter values, rejecting invalid values without a computation"""
+parameterValidator = ShapeDiverParameterValidator()
+
+"""Quantization of parameter values to the precision of the model, shared by all sessions of this worker"""
+parameterQuantizer = ShapeDiverParameterQuantizer()
+
+"""Ids of uploaded files, keyed on model, parameter id and hash of the file contents
+
+Entries expire before the backend discards uploaded files which have not been used.
+"""
+fileUploadCache = ShapeDiverLruCache(maxEntries=1024, ttl=3600)
+
+"""Parsed and indexed session init responses, keyed on the digest of the memoized JSON string"""
+parsedSessionInitResponses = ShapeDiverLruCache(maxEntries=32)
+
+"""Options of the session pools created by ShapeDiverTinySessionSdkPooled"""
+sessionPoolOptions = {'minSessions': 1, 'maxSessions': 4}
+
+"""Session pools, keyed on ticket and modelViewUrl, least recently used pools beyond maxEntries are closed"""
+__sessionPools = ShapeDiverSessionPoolCache(maxEntries=8)
+__sessionPoolsLock = threading.Lock()
+
+"""Chunk size used when reading files to be uploaded, and size up to which they are kept in memory"""
+fileUploadChunkSize = 1024 * 1024
+fileUploadSpoolSize = 8 * 1024 * 1024
 
 def exceptionHandler(e):
     """VIKTOR-specific exception handler to use for ShapeDiverTinySessionSdk
@@ -27,50 +85,190 @@ def __ShapeDiverSessionInitResponseMemoized(ticket, modelViewUrl):
 def parameterMapper(*, paramDict, sdk):
     """Map VIKTOR parameter values to ShapeDiver
     
-    This is used to map special value types like Color or File.
+    This is used to map special value types like Color or File. Parameters may be
+    identified by their id, name, or displayname.
     """
 
-    paramDictSd = {}
-    paramIds = [key for (key, value) in paramDict.items()]
-    for paramId in paramIds:
-        value = paramDict[paramId]
-        if value is None:
-            continue
-        if paramId in sdk.response.response['parameters']:
-            paramDef = sdk.response.response['parameters'][paramId]
-            if paramDef['type'] == 'Color':
-                color = value
-                paramDictSd[paramId] = RgbToShapeDiverColor(color.r, color.g, color.b)
-            elif paramDef['type'] == 'File':
-                # See Viktor FileField and File object
-                # https://docs.viktor.ai/sdk/api/parametrization/#FileField
-                # https://docs.viktor.ai/sdk/api/core/#_File
-                # Note: Reading the whole file into memory, like done in the following, 
-                #       might cause problems in case of big files.
-                fileBinaryContent = value.file.getvalue_binary()
-                # request file upload to ShapeDiver Geometry Backend
-                # we simply use the first allowed content-type (mapping of file ending to content-type to be implemented)
-                body = {}
-                body[paramId] = {}
-                body[paramId]['size'] = len(fileBinaryContent)
-                body[paramId]['format'] = mapFileEndingToContentType(value.filename)
-                uploadResponse = sdk.requestFileUpload(requestBody = body).assetFile(paramId)
-                # upload the file
-                headers = {
-                    'Content-Type': body[paramId]['format']
-                }
-                response = requests.put(uploadResponse['href'], data=fileBinaryContent, headers=headers)
-                if response.status_code != 200:
-                    raise Exception(f'Failed to put file (HTTP status code {response.status_code}): {response.text}')
-                # set parameter value to id of uploaded file
-                paramDictSd[paramId] = uploadResponse['id']
-                # TODO memoize id of uploaded file based on hash of file contents and parameter id
+    return parameterMappingPlan(sdk).map(paramDict = paramDict, sdk = sdk)
+
+class ParameterMappingPlan:
+    """Mapping of VIKTOR parameter values to ShapeDiver, compiled once per model
+
+    Resolves the identifiers used in the parametrization (id, name or displayname 
+    of a parameter, in this order of precedence) to parameter ids, and holds a 
+    converter for the type of each parameter.
+    """
+
+    def __init__(self, response):
+        self.aliases = {}
+        for field in ('displayname', 'name', 'id'):
+            for paramDef in response.parameters():
+                if paramDef.get(field):
+                    self.aliases[paramDef[field]] = paramDef['id']
+        self.converters = {paramDef['id']: parameterConverters.get(paramDef['type'], convertIdentity) for paramDef in response.parameters()}
+        self.types = {paramDef['id']: paramDef['type'] for paramDef in response.parameters()}
+
+    def map(self, *, paramDict, sdk):
+        """Convert VIKTOR parameter values, keyed on ShapeDiver parameter ids"""
+
+        paramDictSd = {}
+        for (alias, value) in paramDict.items():
+            if value is None:
+                continue
+            paramId = self.aliases.get(alias)
+            if paramId is None:
+                paramDictSd[alias] = value
             else:
-                paramDictSd[paramId] = value
-        else:
-            paramDictSd[paramId] = value
+                with instrumentation.span('convert', type=self.types[paramId]):
+                    paramDictSd[paramId] = self.converters[paramId](value, sdk = sdk, paramId = paramId)
+        return paramDictSd
+
+def convertIdentity(value, *, sdk, paramId):
+    return value
+
+def convertColor(value, *, sdk, paramId):
+    return RgbToShapeDiverColor(value.r, value.g, value.b)
+
+def convertFile(value, *, sdk, paramId):
+    return uploadFile(sdk = sdk, paramId = paramId, value = value)
+
+def convertBool(value, *, sdk, paramId):
+    return 'true' if value else 'false'
+
+def convertStringList(value, *, sdk, paramId):
+    # OptionField values are the indices of the choices
+    return str(value)
+
+def convertInteger(value, *, sdk, paramId):
+    # NumberField values are floats, other values are left to validation
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+"""Converters by ShapeDiver parameter type, values of other types are passed on unchanged"""
+parameterConverters = {
+    'Color': convertColor,
+    'File': convertFile,
+    'Bool': convertBool,
+    'StringList': convertStringList,
+    'Int': convertInteger,
+    'Odd': convertInteger,
+    'Even': convertInteger,
+}
+
+"""Compiled parameter mapping plans, keyed on model"""
+parameterMappingPlans = ShapeDiverLruCache(maxEntries=32)
+
+def parameterMappingPlan(sdk):
+    """Get the parameter mapping plan for the model of a session, compiling it on first use"""
 
-    return paramDictSd
+    plan = parameterMappingPlans.get(sdk.modelKey())
+    if plan is None:
+        plan = ParameterMappingPlan(sdk.response)
+        parameterMappingPlans.put(sdk.modelKey(), plan)
+    return plan
+
+def uploadFile(*, sdk, paramId, value):
+    """Upload a file for a parameter of type 'File', returns the id of the uploaded file
+
+    Files whose contents have been uploaded for the same parameter and model before 
+    are not uploaded again.
+    """
+
+    # See Viktor FileField and File object
+    # https://docs.viktor.ai/sdk/api/parametrization/#FileField
+    # https://docs.viktor.ai/sdk/api/core/#_File
+    # The file is read once in chunks, which are hashed and spooled to a temporary 
+    # file, so big files are never held in memory as a whole.
+    with instrumentation.span('upload') as span, value.file.open_binary() as stream, tempfile.SpooledTemporaryFile(max_size=fileUploadSpoolSize) as spool:
+        digest, size = spoolAndHash(stream, spool)
+        span.set(bytes = size)
+        cacheKey = (sdk.modelKey(), paramId, digest)
+        fileId = fileUploadCache.get(cacheKey)
+        span.label(cached = 'true' if fileId is not None else 'false')
+        if fileId is not None:
+            return fileId
+        # request file upload to ShapeDiver Geometry Backend
+        # use the first content-type of the file ending which is accepted by the parameter
+        contentType = mimeRegistry.negotiate(value.filename, sdk.response.parameterById(paramId).get('format', []))
+        if contentType is None:
+            contentType = mimeRegistry.contentType(value.filename)
+        body = {}
+        body[paramId] = {}
+        body[paramId]['size'] = size
+        body[paramId]['format'] = contentType
+        uploadResponse = sdk.requestFileUpload(requestBody = body).assetFile(paramId)
+        # upload the file, streaming it from the spool
+        headers = {
+            'Content-Type': body[paramId]['format'],
+            'Content-Length': str(size)
+        }
+        spool.seek(0)
+        response = httpTransport(uploadResponse['href']).request('PUT', uploadResponse['href'], data=SpoolChunks(spool, size), headers=headers)
+        if response.status_code != 200:
+            raise Exception(f'Failed to put file (HTTP status code {response.status_code}): {response.text}')
+    fileUploadCache.put(cacheKey, uploadResponse['id'])
+    return uploadResponse['id']
+
+def spoolAndHash(stream, spool):
+    """Copy a stream to a spool in chunks, returns SHA-256 hex digest and size of the contents"""
+
+    sha256 = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(fileUploadChunkSize)
+        if not chunk:
+            break
+        sha256.update(chunk)
+        spool.write(chunk)
+        size += len(chunk)
+    return sha256.hexdigest(), size
+
+class SpoolChunks:
+    """Chunks of a spool of known size, to be sent as request body
+
+    requests sends iterables with a length using a Content-Length header. Passing 
+    the spool itself would make requests call its fileno to determine the size, 
+    which rolls the spool over to disk.
+    """
+
+    def __init__(self, spool, size):
+        self.spool = spool
+        self.size = size
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(functools.partial(self.spool.read, fileUploadChunkSize), b'')
+
+def parseSessionInitResponse(responseJson):
+    """Parse a memoized session init response once per process
+
+    The parsed response, including its lazily built indexes, is shared by all 
+    sessions created from the same memoized response.
+    """
+
+    digest = hashlib.blake2b(responseJson.encode(), digest_size=16).digest()
+    response = parsedSessionInitResponses.get(digest)
+    if response is None:
+        response = ShapeDiverResponse(responseJson)
+        parsedSessionInitResponses.put(digest, response)
+    return response
+
+def instrumentedView(name):
+    """Decorator measuring a view method of a VIKTOR controller as span 'view'
+
+    Apply it below the view decorator, all requests made by the view belong to its trace.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def decorate(*args, **kwargs):
+            with instrumentation.span('view', view=name):
+                return func(*args, **kwargs)
+        return decorate
+    return decorator
 
 def ShapeDiverTinySessionSdkMemoized(ticket, modelViewUrl, forceNewSession=False):
     """Memoized version of ShapeDiverTinySessionSdk
@@ -81,10 +279,55 @@ def ShapeDiverTinySessionSdkMemoized(ticket, modelViewUrl, forceNewSession=False
 
     if forceNewSession: 
         sdk = ShapeDiverTinySessionSdk(ticket = ticket, modelViewUrl = modelViewUrl, 
-            exceptionHandler = exceptionHandler, parameterMapper = parameterMapper)
+            exceptionHandler = exceptionHandler, parameterMapper = parameterMapper, resultCache = resultCache, parameterValidator = parameterValidator, parameterQuantizer = parameterQuantizer, resultStore = resultStore, singleFlight = singleFlight, exportCache = exportCache)
     else:
-        response = __ShapeDiverSessionInitResponseMemoized(ticket = ticket, modelViewUrl = modelViewUrl)
-        sdk = ShapeDiverTinySessionSdk(sessionInitResponse = response, modelViewUrl = modelViewUrl, 
-            exceptionHandler = exceptionHandler, parameterMapper = parameterMapper)
+        responseJson = __ShapeDiverSessionInitResponseMemoized(ticket = ticket, modelViewUrl = modelViewUrl)
+        response = parseSessionInitResponse(responseJson)
+        sdk = ShapeDiverTinySessionSdk(sessionInitResponse = response, modelViewUrl = modelViewUrl, ticket = ticket,
+            exceptionHandler = exceptionHandler, parameterMapper = parameterMapper, resultCache = resultCache, parameterValidator = parameterValidator, parameterQuantizer = parameterQuantizer, resultStore = resultStore, singleFlight = singleFlight, exportCache = exportCache)
     return sdk
 
+def ShapeDiverTinySessionSdkPooled(ticket, modelViewUrl, **poolOptions):
+    """Lease a warm session from the pool of sessions with a model
+
+    Use this in a with statement, the session is returned to the pool at its end:
+
+        with ShapeDiverTinySessionSdkPooled(ticket, modelViewUrl) as sdk:
+            sdk.output(paramDict = parameters)
+
+    poolOptions override sessionPoolOptions when the pool is created.
+    """
+
+    return sessionPool(ticket, modelViewUrl, **poolOptions).lease()
+
+def sessionPool(ticket, modelViewUrl, **poolOptions):
+    """Get the pool of sessions with a model, creating it on first use"""
+
+    with __sessionPoolsLock:
+        pool = __sessionPools.get((ticket, modelViewUrl))
+        if pool is None:
+            pool = ShapeDiverSessionPool(ticket = ticket, modelViewUrl = modelViewUrl, **dict(sessionPoolOptions, **poolOptions), 
+                exceptionHandler = exceptionHandler, parameterMapper = parameterMapper, resultCache = resultCache, parameterValidator = parameterValidator, parameterQuantizer = parameterQuantizer, resultStore = resultStore, singleFlight = singleFlight, exportCache = exportCache)
+            __sessionPools.put((ticket, modelViewUrl), pool)
+    return pool
+
+def prewarmSweep(ticket, modelViewUrl, ranges, *, exportIds=(), maxConcurrency=2, checkpointPath=None, ttl=86400, **poolOptions):
+    """Pre-compute a grid of parameter values in the background, warming the caches of this worker
+
+    The result cache is enlarged to hold the results of all points, which are kept 
+    for ttl seconds. Export artifacts are stored in the export cache, which is what 
+    views read. See parameterGrid for the definition of ranges, and ShapeDiverSweep. 
+    poolOptions are used if the pool of sessions with the model is created.
+    Returns the thread running the sweep.
+    """
+
+    pool = sessionPool(ticket, modelViewUrl, **poolOptions)
+    with pool.lease() as sdk:
+        points = list(parameterGrid(sdk.response, ranges))
+        if sdk.resultCache is not None:
+            # one result for the outputs and one per export
+            sdk.resultCache.reserve(len(points) * (1 + len(exportIds)))
+    sweep = ShapeDiverSweep(pool = pool, points = points, exportIds = exportIds, maxConcurrency = maxConcurrency, checkpointPath = checkpointPath, ttl = ttl)
+    thread = threading.Thread(target=sweep.run, name='shapediver-sweep', daemon=True)
+    thread.start()
+    return thread
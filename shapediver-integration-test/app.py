@@ -1,7 +1,7 @@
 from viktor import ViktorController, File, UserMessage, UserError
 from viktor.parametrization import ViktorParametrization, Text, TextField, NumberField, Section, Image, ColorField, Color, OptionListElement, OptionField, FileField
 from viktor.views import GeometryView, GeometryResult
-from ShapeDiverTinySdkViktorUtils import ShapeDiverTinySessionSdkMemoized
+from ShapeDiverTinySdkViktorUtils import ShapeDiverTinySessionSdkPooled, instrumentedView, outputAssetCache
 
 class Parametrization(ViktorParametrization):
     intro = Section('Overview')
@@ -50,6 +50,7 @@ class Controller(ViktorController):
     parametrization = Parametrization
 
     @GeometryView('ShapeDiver Output Geometry', duration_guess=3, update_label='Run ShapeDiver', up_axis='Y')
+    @instrumentedView('geometry')
     def runShapeDiver(self, params, **kwargs):
         
         # Debug output
@@ -61,11 +62,13 @@ class Controller(ViktorController):
         # Get parameter values from section "ShapeDiverParams"
         parameters = params.ShapeDiverParams
 
-        # Initialize a session with the model (memoized)
-        shapeDiverSessionSdk = ShapeDiverTinySessionSdkMemoized(model.ticket, model.modelViewUrl, forceNewSession = True)
+        # Lease a session with the model from the pool
+        # tickets are entered by users, therefore no idle sessions are kept open for them
+        with ShapeDiverTinySessionSdkPooled(model.ticket, model.modelViewUrl, minSessions = 0) as shapeDiverSessionSdk:
 
-        # compute outputs of ShapeDiver model, get resulting glTF 2 assets
-        contentItemsGltf2 = shapeDiverSessionSdk.output(paramDict = parameters).outputContentItemsGltf2()
+            # compute outputs of ShapeDiver model, get resulting glTF 2 assets
+            output = shapeDiverSessionSdk.output(paramDict = parameters)
+            contentItemsGltf2 = output.outputContentItemsGltf2()
         
         if len(contentItemsGltf2) < 1:
             raise UserError('Computation did not result in at least one glTF 2.0 asset.')
@@ -73,6 +76,9 @@ class Controller(ViktorController):
         if len(contentItemsGltf2) > 1: 
             UserMessage.warning(f'Computation resulted in {contentItemsGltf2.count} glTF 2.0 assets, only displaying the first one.')
 
-        glTF_file = File.from_url(contentItemsGltf2[0]['href'])
+        # unchanged outputs are served from the asset cache, held in memory
+        # since the cached file may be replaced while VIKTOR reads it
+        (glTF,) = outputAssetCache.download(output, contentItemsGltf2[:1], mode = 'memory')
+        glTF_file = File.from_data(glTF.data())
 
         return GeometryResult(geometry=glTF_file)
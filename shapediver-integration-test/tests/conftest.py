@@ -0,0 +1,18 @@
+import pytest
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk
+from ShapeDiverTinySdkEmulator import ShapeDiverApiEmulator
+
+@pytest.fixture
+def emulator():
+    """ShapeDiverApiEmulator serving the default model on a local port"""
+
+    with ShapeDiverApiEmulator() as emulator:
+        yield emulator
+
+@pytest.fixture
+def sdk(emulator):
+    """Session with the emulator, closed after the test"""
+
+    sdk = ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url)
+    yield sdk
+    sdk.close()
@@ -0,0 +1,23 @@
+from ShapeDiverTinySdkBenchmark import percentile, measure, compare, benchmarks
+
+def testPercentile():
+    assert percentile([1, 2, 3, 4], 0.5) == 2
+    assert percentile([1, 2, 3, 4], 0.99) == 4
+    assert percentile([], 0.5) is None
+
+def testRegressionsBeyondTolerance():
+    baseline = {'output': {'p50': 0.010, 'throughput': 100}, 'removed': {'p50': 1}}
+    results = {'output': {'p50': 0.013, 'throughput': 95}, 'added': {'p50': 1}}
+    assert compare(results, baseline, tolerance = 0.2) == ['output p50: 0.01 -> 0.013 (+30.0%)']
+    assert round(results['output']['change']['throughput'], 2) == -0.05
+
+def testMeasure():
+    calls = []
+    result = measure(calls.append, iterations = 10, warmup = 2, allocationIterations = 3)
+    assert calls == list(range(15))
+    assert result['iterations'] == 10 and result['p50'] <= result['p99']
+
+def testBenchmarksRunAgainstTheEmulator(emulator):
+    results = benchmarks(emulator, iterations = 2)
+    assert {'parameterMapper', 'fileUpload', 'memoizedSession'} <= set(results)
+    assert emulator.stats()['openSession'] >= 1
@@ -0,0 +1,53 @@
+import math
+import pytest
+from ShapeDiverTinySdk import ShapeDiverSessionPool, ShapeDiverResultCache, ShapeDiverExportCache, ShapeDiverLruCache
+from ShapeDiverTinySdkSweep import ShapeDiverSweep, parameterRange, parameterGrid
+
+def testParameterRange():
+    assert parameterRange({'type': 'Float', 'min': 1, 'max': 2, 'decimalplaces': 1}, count = 4) == [1.0, 1.3, 1.7, 2.0]
+    assert parameterRange({'type': 'Int', 'min': 1, 'max': 20}, count = 3) == [1, 11, 20]
+    assert parameterRange({'type': 'Odd', 'min': 0, 'max': 6}, count = 5) == [1, 3, 5]
+    assert parameterRange({'type': 'Even', 'min': 1.5, 'max': 9}, count = 2) == [2, 8]
+    assert parameterRange({'type': 'Bool'}) == [False, True]
+    assert parameterRange({'type': 'StringList', 'choices': ['a', 'b']}) == ['0', '1']
+    with pytest.raises(Exception, match='can not be swept'):
+        parameterRange({'type': 'Color'})
+
+def testParameterGrid(sdk):
+    points = list(parameterGrid(sdk.response, {'Count': 2, 'p-closed': [True], 'Profile': 3}))
+    assert len(points) == 6
+    assert points[0] == {'p-count': 1, 'p-closed': True, 'p-profile': '0'}
+    assert points[-1] == {'p-count': 20, 'p-closed': True, 'p-profile': '2'}
+    with pytest.raises(Exception, match='Unknown parameter'):
+        list(parameterGrid(sdk.response, {'Width': 2}))
+
+def testSweepWarmsCachesAndResumes(emulator, tmp_path):
+    resultCache = ShapeDiverResultCache()
+    exportCache = ShapeDiverExportCache(directory = str(tmp_path / 'exports'))
+    pool = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 0, resultCache = resultCache, exportCache = exportCache)
+    checkpointPath = str(tmp_path / 'checkpoint.jsonl')
+    points = [{'p-count': count} for count in range(1, 7)]
+    try:
+        results = []
+        counters = ShapeDiverSweep(pool = pool, points = points[:4], exportIds = ['e-png'], checkpointPath = checkpointPath, ttl = math.inf).run(onResult = lambda point, computation: results.append(point))
+        assert (counters['completed'], counters['failed'], len(results)) == (4, 0, 4)
+        assert len(exportCache) == 4
+        assert all(expires == math.inf for (value, expires, size) in resultCache.entries.values())
+        # resumed, completed points are skipped
+        counters = ShapeDiverSweep(pool = pool, points = points, exportIds = ['e-png'], checkpointPath = checkpointPath).run()
+        assert (counters['completed'], counters['skipped']) == (2, 4)
+        assert (emulator.stats()['computeOutputs'], emulator.stats()['computeExports']) == (6, 6)
+        # the views read the artifacts without a request
+        with pool.lease() as sdk:
+            assert sdk.compute(exportIds = ['e-png'], paramDict = {'p-count': 5}).exportAsset('e-png').cached
+        assert emulator.stats()['computeExports'] == 6
+    finally:
+        pool.close()
+
+def testCacheReserve():
+    cache = ShapeDiverLruCache(maxEntries = 4, maxBytes = 100)
+    cache.put('a', 1)
+    cache.reserve(2)
+    assert (cache.maxEntries, cache.maxBytes) == (4, 100)
+    cache.reserve(7)
+    assert (cache.maxEntries, cache.maxBytes) == (8, 200)
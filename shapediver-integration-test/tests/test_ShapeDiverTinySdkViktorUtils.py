@@ -0,0 +1,106 @@
+import json
+import tempfile
+import uuid
+from types import SimpleNamespace
+from viktor import Color, File
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverResponse
+import ShapeDiverTinySdkViktorUtils as utils
+
+def fileValue(data, filename='points.csv'):
+    return SimpleNamespace(file = File.from_data(data), filename = filename)
+
+# parameter mapping
+
+def testAliasPrecedence():
+    response = ShapeDiverResponse({'parameters': {
+        'a': {'id': 'a', 'name': 'A', 'displayname': 'Length', 'type': 'Float'},
+        'b': {'id': 'b', 'name': 'Length', 'displayname': 'Width', 'type': 'Float'},
+        'Width': {'id': 'Width', 'name': 'W', 'displayname': 'W', 'type': 'Float'},
+    }})
+    plan = utils.ParameterMappingPlan(response)
+    # ids take precedence over names, names over displaynames
+    assert plan.map(paramDict = {'Length': 1, 'Width': 2, 'A': 3, 'unknown': 4}, sdk = None) == {'b': 1, 'Width': 2, 'a': 3, 'unknown': 4}
+
+def testValuesAreConverted(sdk):
+    paramDict = utils.parameterMapper(paramDict = {'Color': Color(255, 0, 16), 'Closed': True, 'Profile': 2, 'Count': 6.0, 'Label': None}, sdk = sdk)
+    assert paramDict == {'p-color': '0xff0010ff', 'p-closed': 'true', 'p-profile': '2', 'p-count': 6}
+    assert isinstance(paramDict['p-count'], int)
+    # only the representation of integers changes, other values are left to validation
+    assert utils.parameterMapper(paramDict = {'Count': 6.6}, sdk = sdk) == {'p-count': 6.6}
+    assert utils.parameterMapper(paramDict = {'Count': '6'}, sdk = sdk) == {'p-count': '6'}
+
+# file uploads
+
+def testIdenticalFilesAreUploadedOnce(sdk, emulator):
+    data = f'x,y\n{uuid.uuid4()}\n'.encode() * 1000
+    first = utils.parameterMapper(paramDict = {'File': fileValue(data)}, sdk = sdk)
+    second = utils.parameterMapper(paramDict = {'File': fileValue(data, 'copy.csv')}, sdk = sdk)
+    assert first == second
+    assert (emulator.stats()['requestFileUpload'], emulator.stats()['uploadFile']) == (1, 1)
+    upload = emulator.uploads[first['p-file']]
+    assert (upload['size'], upload['received'], upload['format']) == (len(data), len(data), 'text/csv')
+    utils.parameterMapper(paramDict = {'File': fileValue(data + b'1,2\n')}, sdk = sdk)
+    assert emulator.stats()['uploadFile'] == 2
+
+def testUploadsAreSpooledInMemory(sdk, emulator, monkeypatch):
+    rollovers = []
+    rollover = tempfile.SpooledTemporaryFile.rollover
+    def countingRollover(spool):
+        rollovers.append(spool)
+        rollover(spool)
+    monkeypatch.setattr(tempfile.SpooledTemporaryFile, 'rollover', countingRollover)
+    data = f'{uuid.uuid4()}\n'.encode() * 1000
+    utils.parameterMapper(paramDict = {'File': fileValue(data)}, sdk = sdk)
+    assert rollovers == []
+    assert [upload['received'] for upload in emulator.uploads.values()] == [len(data)]
+
+# session pools
+
+def testSessionPoolsAreSharedPerModel(emulator):
+    pool = utils.sessionPool(emulator.ticket, emulator.url, minSessions = 0)
+    try:
+        assert utils.sessionPool(emulator.ticket, emulator.url) is pool
+        assert (pool.minSessions, pool.maxSessions) == (0, utils.sessionPoolOptions['maxSessions'])
+        with utils.ShapeDiverTinySessionSdkPooled(emulator.ticket, emulator.url) as sdk:
+            assert sdk.pool is pool
+    finally:
+        pool.close()
+
+# memoized session init responses
+
+def testSessionInitResponseIsParsedOnce(sdk, emulator):
+    responseJson = json.dumps(sdk.response.response)
+    response = utils.parseSessionInitResponse(responseJson)
+    assert utils.parseSessionInitResponse(responseJson) is response
+    assert utils.parseSessionInitResponse(json.dumps(sdk.response.response, indent = 1)) is not response
+    # sessions created from the memoized response share it, including its indexes
+    first = ShapeDiverTinySessionSdk(sessionInitResponse = response, modelViewUrl = emulator.url, ticket = emulator.ticket)
+    second = ShapeDiverTinySessionSdk(sessionInitResponse = utils.parseSessionInitResponse(responseJson), modelViewUrl = emulator.url, ticket = emulator.ticket)
+    assert first.response is second.response is response
+    assert first.response.parameterByName('Count') is second.response.parameterByName('Count')
+
+# sweeps
+
+def testPrewarmSweepFitsTheGrid(emulator, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, 'resultCache', utils.ShapeDiverResultCache(maxEntries = 4))
+    monkeypatch.setattr(utils, 'exportCache', utils.ShapeDiverExportCache(directory = str(tmp_path)))
+    utils.prewarmSweep(emulator.ticket, emulator.url, {'Count': 5, 'Profile': 3}, exportIds = ['e-png'], minSessions = 0).join()
+    pool = utils.sessionPool(emulator.ticket, emulator.url)
+    try:
+        assert utils.resultCache.maxEntries >= 30
+        assert utils.resultCache.stats()['evictions'] == 0
+        assert len(utils.exportCache) == 15
+    finally:
+        pool.close()
+
+# instrumentation
+
+def testInstrumentedViewsAreMeasured(sdk):
+    @utils.instrumentedView('geometry')
+    def view():
+        return sdk.output(paramDict = {'p-count': 2})
+    utils.metrics.clear()
+    view()
+    names = {(name, dict(labels).get('view'), dict(labels).get('action')) for (name, labels) in utils.metrics.snapshot()}
+    assert ('shapediver_view_seconds', 'geometry', None) in names
+    assert ('shapediver_request_seconds', None, 'compute outputs') in names
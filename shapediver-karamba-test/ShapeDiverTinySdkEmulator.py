@@ -0,0 +1,365 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+"""Definition of the model served by the emulator, used unless another one is given"""
+defaultModel = {
+    'id': 'emulated-model',
+    'parameters': [
+        {'id': 'p-length', 'name': 'Length', 'displayname': 'Length', 'type': 'Float', 'defval': '10', 'min': 1, 'max': 100, 'decimalplaces': 2},
+        {'id': 'p-count', 'name': 'Count', 'displayname': 'Count', 'type': 'Int', 'defval': '4', 'min': 1, 'max': 20},
+        {'id': 'p-closed', 'name': 'Closed', 'displayname': 'Closed', 'type': 'Bool', 'defval': 'false'},
+        {'id': 'p-profile', 'name': 'Profile', 'displayname': 'Profile', 'type': 'StringList', 'defval': '0', 'choices': ['HEA', 'HEB', 'IPE']},
+        {'id': 'p-color', 'name': 'Color', 'displayname': 'Color', 'type': 'Color', 'defval': '0xffffffff'},
+        {'id': 'p-label', 'name': 'Label', 'displayname': 'Label', 'type': 'String', 'defval': '', 'max': 100},
+        {'id': 'p-file', 'name': 'File', 'displayname': 'File', 'type': 'File', 'defval': '', 'format': ['text/csv', 'application/json']},
+    ],
+    'outputs': [
+        {'id': 'o-geometry', 'name': 'Geometry', 'displayname': 'Geometry', 'contentType': 'model/gltf-binary'},
+        {'id': 'o-mass', 'name': 'Mass', 'displayname': 'Mass', 'data': True, 'dependsOn': ['p-length', 'p-count', 'p-profile']},
+    ],
+    'exports': [
+        {'id': 'e-png', 'name': 'DownloadPng', 'displayname': 'Download Png', 'contentType': 'image/png'},
+        {'id': 'e-pdf', 'name': 'DownloadPdf', 'displayname': 'Download Pdf', 'contentType': 'application/pdf'},
+    ],
+}
+
+class ShapeDiverApiEmulator:
+    """Local emulator of the ShapeDiver Geometry Backend API v2
+
+    Serves the endpoints used by ShapeDiverTinySessionSdk on a local port: opening
+    sessions using a ticket, computing outputs and exports, requesting file uploads,
+    uploading files, downloading assets, getting default values and closing sessions. Results are derived
+    deterministically from the parameter values, the versions of outputs change only
+    if the values of the parameters they depend on do ('dependsOn' of an output 
+    definition, all parameters by default).
+
+    Every request is answered after latency seconds, computations after further
+    computeLatency seconds. The fraction rateLimitRate of computations is answered
+    with HTTP status code 429 (with a Retry-After of retryAfter seconds), the fraction
+    delayRate is reported as delayed by delay milliseconds the first time it is
+    requested. These settings may be changed while the emulator is running.
+
+    Use it in a with statement, or call start and close:
+
+        with ShapeDiverApiEmulator(latency = 0.01) as emulator:
+            sdk = ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url)
+    """
+
+    def __init__(self, *, model=None, ticket='emulated-ticket', latency=0, computeLatency=0, rateLimitRate=0, retryAfter=0.01, delayRate=0, delay=10, assetSize=64 * 1024, seed=0):
+        self.model = model if model is not None else defaultModel
+        self.ticket = ticket
+        self.latency = latency
+        self.computeLatency = computeLatency
+        self.rateLimitRate = rateLimitRate
+        self.retryAfter = retryAfter
+        self.delayRate = delayRate
+        self.delay = delay
+        self.assetSize = assetSize
+        self.random = random.Random(seed)
+        self.sessions = set()
+        self.uploads = {}
+        self.delayed = set()
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def start(self):
+        """Start serving on a free local port, returns the URL to use as modelViewUrl"""
+
+        # handlers are instantiated per request, they find the emulator as class attribute
+        Handler = type('Handler', (ShapeDiverApiEmulatorHandler,), {'emulator': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='shapediver-emulator', daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        return self.url
+
+    def close(self):
+        """Stop serving"""
+
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        """Number of requests per endpoint and outcome, and number of open sessions"""
+
+        with self.lock:
+            return dict(self.counters, openSessions=len(self.sessions))
+
+    def reset(self):
+        """Reset counters and forget delayed computations"""
+
+        with self.lock:
+            self.counters = {}
+            self.delayed = set()
+
+    def expireSessions(self):
+        """Forget all open sessions, requests for them are answered like for expired sessions"""
+
+        with self.lock:
+            self.sessions = set()
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+
+    def _chance(self, rate):
+        with self.lock:
+            return rate > 0 and self.random.random() < rate
+
+    def _version(self, itemId, parameters, dependsOn=None):
+        if dependsOn is not None:
+            parameters = {paramId: parameters[paramId] for paramId in dependsOn}
+        key = json.dumps([itemId, parameters], sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    def _parameters(self, paramDict):
+        """Effective parameter values, raises ValueError for unknown parameters"""
+
+        values = {paramDef['id']: paramDef['defval'] for paramDef in self.model['parameters']}
+        for (paramId, value) in paramDict.items():
+            if paramId not in values:
+                raise ValueError(f'Unknown parameter {paramId}')
+            values[paramId] = value if isinstance(value, str) else json.dumps(value)
+        return values
+
+    def _sessionResponse(self, sessionId, *, parameters=None, exportIds=None):
+        """Response containing the definitions of the model, the outputs computed for 
+        the parameter values (the defaults if there are none), and the requested exports"""
+
+        if parameters is None:
+            parameters = self._parameters({})
+        response = {
+            'sessionId': sessionId,
+            'model': {'id': self.model['id']},
+            'parameters': {paramDef['id']: paramDef for paramDef in self.model['parameters']},
+            'outputs': {},
+            'exports': {},
+        }
+        if exportIds is None:
+            for outputDef in self.model['outputs']:
+                output = {'id': outputDef['id'], 'name': outputDef['name'], 'displayname': outputDef['displayname'],
+                    'version': self._version(outputDef['id'], parameters, outputDef.get('dependsOn'))}
+                if outputDef.get('data'):
+                    digest = int(output['version'], 16)
+                    output['content'] = [{'format': 'data', 'data': (digest % 100000) / 100}]
+                else:
+                    output['content'] = [{'contentType': outputDef['contentType'], 'href': f'{self.url}/asset/{output["version"]}/{outputDef["id"]}'}]
+                response['outputs'][outputDef['id']] = output
+        for exportDef in self.model['exports']:
+            export = {'id': exportDef['id'], 'name': exportDef['name'], 'displayname': exportDef['displayname'], 'type': 'download'}
+            if exportIds is not None and exportDef['id'] in exportIds:
+                export['version'] = self._version(exportDef['id'], parameters)
+                export['content'] = [{'contentType': exportDef['contentType'], 'href': f'{self.url}/asset/{export["version"]}/{exportDef["id"]}'}]
+            response['exports'][exportDef['id']] = export
+        return response
+
+class ShapeDiverApiEmulatorHandler(BaseHTTPRequestHandler):
+    """Request handler of ShapeDiverApiEmulator"""
+
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, which Nagle's algorithm would delay
+    disable_nagle_algorithm = True
+    emulator = None
+
+    routes = [
+        ('POST', re.compile(r'^/api/v2/ticket/(?P<ticket>[^/]+)$'), 'openSession'),
+        ('PUT', re.compile(r'^/api/v2/session/(?P<sessionId>[^/]+)/output$'), 'computeOutputs'),
+        ('PUT', re.compile(r'^/api/v2/session/(?P<sessionId>[^/]+)/export$'), 'computeExports'),
+        ('POST', re.compile(r'^/api/v2/session/(?P<sessionId>[^/]+)/file/upload$'), 'requestFileUpload'),
+        ('POST', re.compile(r'^/api/v2/session/(?P<sessionId>[^/]+)/close$'), 'closeSession'),
+        ('GET', re.compile(r'^/api/v2/session/(?P<sessionId>[^/]+)/default$'), 'sessionDefaults'),
+        ('PUT', re.compile(r'^/upload/(?P<fileId>[^/]+)$'), 'uploadFile'),
+        ('GET', re.compile(r'^/asset/(?P<version>[^/]+)/(?P<itemId>[^/]+)$'), 'downloadAsset'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch()
+
+    def do_PUT(self):
+        self.dispatch()
+
+    def do_POST(self):
+        self.dispatch()
+
+    def dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length > 0 else b''
+        emulator = self.emulator
+        if emulator.latency > 0:
+            time.sleep(emulator.latency)
+        for (method, pattern, name) in self.routes:
+            match = pattern.match(self.path)
+            if method == self.command and match is not None:
+                emulator._count(name)
+                try:
+                    getattr(self, name)(**match.groupdict())
+                except ValueError as e:
+                    self.reply(400, {'message': str(e)})
+                return
+        emulator._count('notFound')
+        self.reply(404, {'message': f'No route {self.command} {self.path}'})
+
+    def reply(self, status, body, headers={}):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', headers.get('Content-Type', 'application/json'))
+        self.send_header('Content-Length', str(len(data)))
+        for (name, value) in headers.items():
+            if name != 'Content-Type':
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def session(self, sessionId):
+        """Check that a session is open, replies 404 otherwise"""
+
+        with self.emulator.lock:
+            found = sessionId in self.emulator.sessions
+        if not found:
+            self.emulator._count('unknownSession')
+            self.reply(404, {'message': f'Unknown session {sessionId}'})
+        return found
+
+    def compute(self, key):
+        """Apply compute latency and injected faults
+
+        Returns True if the computation is finished, None if it is to be reported as
+        delayed, and False if the request has been answered already.
+        """
+
+        emulator = self.emulator
+        if emulator._chance(emulator.rateLimitRate):
+            emulator._count('rateLimited')
+            self.reply(429, {'message': 'Too many requests'}, {'Retry-After': str(emulator.retryAfter)})
+            return False
+        if emulator.computeLatency > 0:
+            time.sleep(emulator.computeLatency)
+        with emulator.lock:
+            delayed = key in emulator.delayed
+            emulator.delayed.discard(key)
+        if not delayed and emulator._chance(emulator.delayRate):
+            with emulator.lock:
+                emulator.delayed.add(key)
+            emulator._count('delayed')
+            return None
+        return True
+
+    def openSession(self, ticket):
+        emulator = self.emulator
+        if ticket != emulator.ticket:
+            self.reply(401, {'message': f'Invalid ticket {ticket}'})
+            return
+        paramDict = json.loads(self.body or b'{}')
+        emulator._parameters(paramDict)
+        sessionId = uuid.uuid4().hex
+        with emulator.lock:
+            emulator.sessions.add(sessionId)
+        self.reply(201, emulator._sessionResponse(sessionId))
+
+    def computeOutputs(self, sessionId):
+        if not self.session(sessionId):
+            return
+        parameters = self.emulator._parameters(json.loads(self.body or b'{}'))
+        computed = self.compute((sessionId, 'output', json.dumps(parameters, sort_keys=True)))
+        if computed is False:
+            return
+        response = self.emulator._sessionResponse(sessionId, parameters = parameters)
+        if computed is None:
+            for output in response['outputs'].values():
+                output['delay'] = self.emulator.delay
+                del output['content']
+        self.reply(200, response)
+
+    def computeExports(self, sessionId):
+        if not self.session(sessionId):
+            return
+        body = json.loads(self.body or b'{}')
+        parameters = self.emulator._parameters(body.get('parameters', {}))
+        exportIds = body.get('exports', [])
+        computed = self.compute((sessionId, 'export', json.dumps([parameters, exportIds], sort_keys=True)))
+        if computed is False:
+            return
+        response = self.emulator._sessionResponse(sessionId, parameters = parameters, exportIds = exportIds)
+        if computed is None:
+            for exportId in exportIds:
+                export = response['exports'][exportId]
+                export['delay'] = self.emulator.delay
+                del export['content']
+        self.reply(200, response)
+
+    def requestFileUpload(self, sessionId):
+        if not self.session(sessionId):
+            return
+        emulator = self.emulator
+        files = {}
+        for (paramId, request) in json.loads(self.body or b'{}').items():
+            fileId = uuid.uuid4().hex
+            with emulator.lock:
+                emulator.uploads[fileId] = {'paramId': paramId, 'size': request.get('size'), 'format': request.get('format'), 'received': None}
+            files[paramId] = {'id': fileId, 'href': f'{emulator.url}/upload/{fileId}'}
+        self.reply(200, dict(emulator._sessionResponse(sessionId), asset = {'file': files}))
+
+    def uploadFile(self, fileId):
+        emulator = self.emulator
+        with emulator.lock:
+            upload = emulator.uploads.get(fileId)
+            if upload is not None:
+                upload['received'] = len(self.body)
+        if upload is None:
+            self.reply(404, {'message': f'Unknown file {fileId}'})
+        else:
+            self.reply(200, b'', {'Content-Type': 'text/plain'})
+
+    def downloadAsset(self, version, itemId):
+        size = self.emulator.assetSize
+        pattern = f'{itemId}:{version}\n'.encode()
+        data = (pattern * (size // len(pattern) + 1))[:size]
+        self.reply(200, data, {'Content-Type': 'application/octet-stream'})
+
+    def sessionDefaults(self, sessionId):
+        if not self.session(sessionId):
+            return
+        parameters = self.emulator._parameters({})
+        self.reply(200, {'sessionId': sessionId, 'parameters': parameters})
+
+    def closeSession(self, sessionId):
+        if not self.session(sessionId):
+            return
+        with self.emulator.lock:
+            self.emulator.sessions.discard(sessionId)
+        self.reply(200, {'sessionId': sessionId})
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve an emulator of the ShapeDiver API on a local port')
+    parser.add_argument('--latency', type=float, default=0, help='emulated network latency per request in seconds')
+    parser.add_argument('--compute-latency', type=float, default=0, help='emulated computation time in seconds')
+    parser.add_argument('--rate-limit-rate', type=float, default=0, help='fraction of computations rate limited')
+    parser.add_argument('--delay-rate', type=float, default=0, help='fraction of computations delayed')
+    args = parser.parse_args()
+    with ShapeDiverApiEmulator(latency = args.latency, computeLatency = args.compute_latency, rateLimitRate = args.rate_limit_rate, delayRate = args.delay_rate) as emulator:
+        print(f'Serving ShapeDiver API emulator, use SD_MODEL_VIEW_URL={emulator.url} SD_TICKET={emulator.ticket}')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,294 @@
+import atexit
+import glob
+import hashlib
+import json
+import math
+import numbers
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from ShapeDiverTinySdk import canonicalParameters
+
+try:
+    # optional, used for columns and vectorised queries
+    import numpy as np
+except ImportError:
+    np = None
+
+def parameterHash(paramDict):
+    """Hash of the canonical representation of parameter values"""
+
+    return hashlib.sha1(canonicalParameters(paramDict).encode()).hexdigest()
+
+def scalarOutputValue(output):
+    """Numeric value of an output returning data (first content item), None if there is none"""
+
+    for item in output.get('content', []):
+        value = item.get('data')
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+    return None
+
+class ShapeDiverResultStore:
+    """Append-only columnar store of computations
+
+    Every recorded computation becomes a row containing its kind ('output' or 'export'),
+    model, parameter hash, timestamp and duration, the parameter values (columns
+    'param.{id}', typed by the session, see ShapeDiverResponse.typedParameterValue), output versions ('version.{id}'), export hrefs ('href.{id}') and
+    the values of the scalar outputs named in scalarOutputs ('scalar.{name}').
+
+    Values are appended to per-column buffers, which are converted into a chunk of
+    columns every chunkSize rows. Columns are NumPy arrays if NumPy is installed 
+    (lists otherwise), so that queries over many computations are answered locally
+    using vectorised filters. Chunks beyond maxRows rows are dropped from memory, 
+    oldest first.
+
+    If directory path is given, rows are appended to a JSON lines journal in the
+    background, which compact converts into a NumPy segment. Both are loaded on start.
+    """
+
+    def __init__(self, *, path=None, scalarOutputs=(), chunkSize=1024, maxRows=100000):
+        self.path = path
+        self.scalarOutputs = tuple(scalarOutputs)
+        self.chunkSize = chunkSize
+        self.maxRows = maxRows
+        """Converted chunks as tuples (number of rows, columns), oldest first"""
+        self.chunks = deque()
+        self.chunkRows = 0
+        """Columns of the rows not converted yet, lists of equal length"""
+        self.buffer = {}
+        self.bufferRows = 0
+        self.arrays = None
+        self.lock = threading.Lock()
+        """Rows to be appended to the journal by the writer thread"""
+        self.pending = None
+        self.journalLock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+            self.pending = queue.Queue()
+            threading.Thread(target=self._writeJournal, name='shapediver-result-store', daemon=True).start()
+            atexit.register(self.flush)
+
+    def record(self, *, kind, model, paramDict, response, seconds, exportIds=None):
+        """Record a computation of outputs, or of the given exports"""
+
+        row = {'rowId': uuid.uuid4().hex, 'kind': kind, 'model': str(model), 'hash': parameterHash(paramDict),
+            'timestamp': time.time(), 'seconds': seconds}
+        for (paramId, value) in paramDict.items():
+            row[f'param.{paramId}'] = value
+        if exportIds is None:
+            for output in response.outputs():
+                row[f'version.{output["id"]}'] = output.get('version')
+            for name in self.scalarOutputs:
+                output = response.outputByName(name)
+                if output is not None:
+                    row[f'scalar.{name}'] = scalarOutputValue(output)
+        else:
+            for exportId in exportIds:
+                content = (response.exportById(exportId) or {}).get('content', [])
+                row[f'href.{exportId}'] = content[0].get('href') if len(content) > 0 else None
+        with self.lock:
+            self._append(row)
+        if self.pending is not None:
+            self.pending.put(row)
+
+    def flush(self):
+        """Wait until all recorded rows have been appended to the journal"""
+
+        if self.pending is not None:
+            self.pending.join()
+
+    def __len__(self):
+        return self.chunkRows + self.bufferRows
+
+    def columns(self):
+        """All columns, as NumPy arrays (float for numeric columns, missing values NaN) or lists
+
+        Joins the columns of all chunks, use query to select rows without doing so.
+        """
+
+        with self.lock:
+            if self.arrays is None:
+                chunks = self._chunks()
+                self.arrays = self._join(chunks, list(dict.fromkeys(name for (_, data) in chunks for name in data)))
+            return self.arrays
+
+    def query(self, where={}, *, columns=None):
+        """Select rows, returns the selected columns (all by default) of the matching rows
+
+        where maps column names to a value, a (minimum, maximum) tuple, or a function
+        called with the column which returns a boolean mask (or list of booleans).
+        Functions are called once per chunk of rows. Values and tuples must match the
+        type of the column, numbers for numeric columns and strings otherwise.
+        """
+
+        with self.lock:
+            chunks = self._chunks()
+        names = columns if columns is not None else list(dict.fromkeys(name for (_, data) in chunks for name in data))
+        selected = [self._select(count, data, where) for (count, data) in chunks]
+        return self._join(selected, names)
+
+    def compact(self):
+        """Convert the journal into a NumPy segment, requires NumPy and a path"""
+
+        if np is None or self.path is None:
+            raise Exception('Compacting the result store requires NumPy and a path')
+        self.flush()
+        journal = os.path.join(self.path, 'journal.jsonl')
+        with self.journalLock:
+            if not os.path.exists(journal):
+                return
+            with open(journal) as file:
+                rows = [json.loads(line) for line in file if line.strip()]
+            names = list(dict.fromkeys(name for row in rows for name in row))
+            segment = os.path.join(self.path, f'segment-{time.time_ns()}.npz')
+            with open(segment + '.tmp', 'wb') as file:
+                np.savez(file, **self._columns({name: [row.get(name) for row in rows] for name in names}))
+            os.replace(segment + '.tmp', segment)
+            # rows contained in both segment and journal after a crash are deduplicated on load
+            os.remove(journal)
+
+    def _append(self, row):
+        """Append a row to the buffers, called with the lock held"""
+
+        for name in row:
+            if name not in self.buffer:
+                self.buffer[name] = [None] * self.bufferRows
+        for (name, values) in self.buffer.items():
+            values.append(row.get(name))
+        self.bufferRows += 1
+        self.arrays = None
+        if self.bufferRows >= self.chunkSize:
+            (count, buffer) = (self.bufferRows, self.buffer)
+            self.buffer = {}
+            self.bufferRows = 0
+            self._addChunk(count, self._columns(buffer))
+
+    def _addChunk(self, count, columns):
+        """Add converted columns, dropping the oldest chunks beyond maxRows, called with the lock held"""
+
+        self.chunks.append((count, columns))
+        self.chunkRows += count
+        while len(self.chunks) > 1 and self.chunkRows + self.bufferRows > self.maxRows:
+            self.chunkRows -= self.chunks.popleft()[0]
+        self.arrays = None
+
+    def _chunks(self):
+        """All chunks including the buffered rows, called with the lock held"""
+
+        chunks = list(self.chunks)
+        if self.bufferRows > 0:
+            chunks.append((self.bufferRows, self._columns(self.buffer)))
+        return chunks
+
+    def _select(self, count, data, where):
+        """Rows of a chunk matching the conditions, as tuple (number of rows, columns)"""
+
+        if np is not None:
+            mask = np.ones(count, dtype=bool)
+            for (name, condition) in where.items():
+                column = data.get(name)
+                if column is None:
+                    mask[:] = False
+                    continue
+                if callable(condition):
+                    mask &= np.asarray(condition(column), dtype=bool)
+                    continue
+                if column.dtype.kind != 'f' or not np.isnan(column).all():
+                    self._checkCondition(name, condition, column.dtype.kind == 'f')
+                if isinstance(condition, tuple):
+                    mask &= (column >= condition[0]) & (column <= condition[1])
+                else:
+                    mask &= column == condition
+            return (int(mask.sum()), {name: column[mask] for (name, column) in data.items()})
+        selected = list(range(count))
+        for (name, condition) in where.items():
+            column = data.get(name, [None] * count)
+            if not callable(condition) and any(value is not None for value in column):
+                self._checkCondition(name, condition, all(value is None or isinstance(value, numbers.Number) for value in column))
+            if callable(condition):
+                flags = condition(column)
+                selected = [i for i in selected if flags[i]]
+            elif isinstance(condition, tuple):
+                selected = [i for i in selected if column[i] is not None and condition[0] <= column[i] <= condition[1]]
+            else:
+                selected = [i for i in selected if column[i] == condition]
+        return (len(selected), {name: [column[i] for i in selected] for (name, column) in data.items()})
+
+    def _checkCondition(self, name, condition, numeric):
+        """Raise an exception if the values of a condition don't match the type of the column"""
+
+        for value in (condition if isinstance(condition, tuple) else (condition,)):
+            if isinstance(value, numbers.Number) != numeric:
+                raise Exception(f'Condition {condition!r} on column {name} does not match its values, which are {"numbers" if numeric else "strings"}')
+
+    def _join(self, chunks, names):
+        """Join the given columns of chunks, filling in missing values"""
+
+        columns = {}
+        for name in names:
+            if not any(name in data for (_, data) in chunks):
+                continue
+            if np is None:
+                columns[name] = [value for (count, data) in chunks for value in data.get(name, [None] * count)]
+                continue
+            parts = [data[name] if name in data else np.full(count, math.nan) for (count, data) in chunks]
+            if any(part.dtype.kind == 'U' for part in parts):
+                # columns which are numeric in some chunks only are joined as strings
+                parts = [part if part.dtype.kind == 'U' else np.where(np.isnan(part), '', part.astype(str)) for part in parts]
+            columns[name] = np.concatenate(parts)
+        return columns
+
+    def _columns(self, values):
+        """Convert lists of values to columns"""
+
+        columns = {}
+        for (name, column) in values.items():
+            numeric = all(value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)) for value in column)
+            if np is None:
+                columns[name] = list(column)
+            elif numeric:
+                columns[name] = np.array([math.nan if value is None else value for value in column], dtype=float)
+            else:
+                columns[name] = np.array(['' if value is None else str(value) for value in column], dtype=str)
+        return columns
+
+    def _writeJournal(self):
+        """Writer thread appending recorded rows to the journal in batches"""
+
+        journal = os.path.join(self.path, 'journal.jsonl')
+        while True:
+            rows = [self.pending.get()]
+            while True:
+                try:
+                    rows.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self.journalLock, open(journal, 'a') as file:
+                    file.write(''.join(json.dumps(row, default=str) + '\n' for row in rows))
+            finally:
+                for row in rows:
+                    self.pending.task_done()
+
+    def _load(self):
+        seen = set()
+        if np is not None:
+            for segment in sorted(glob.glob(os.path.join(self.path, 'segment-*.npz'))):
+                with np.load(segment) as data:
+                    columns = {name: data[name] for name in data.files}
+                seen.update(columns['rowId'].tolist())
+                count = min(len(columns['rowId']), self.maxRows)
+                self._addChunk(count, {name: column[-count:] for (name, column) in columns.items()})
+        journal = os.path.join(self.path, 'journal.jsonl')
+        if os.path.exists(journal):
+            with open(journal) as file:
+                for line in file:
+                    if line.strip():
+                        row = json.loads(line)
+                        if row['rowId'] not in seen:
+                            self._append(row)
@@ -0,0 +1,152 @@
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ShapeDiverTinySdk import ShapeDiverResultCache, canonicalParameters, instrumentation
+
+def parameterRange(paramDef, *, count=5):
+    """Values of a parameter to be used in a sweep, derived from its definition
+
+    Number parameters are sampled at count evenly spaced values between 'min' and
+    'max' (all values if there are fewer), rounded to the precision of the parameter.
+    Bool parameters result in both values, StringList parameters in all choices.
+    """
+
+    paramType = paramDef['type']
+    if paramType == 'Bool':
+        return [False, True]
+    if paramType == 'StringList':
+        return [str(index) for index in range(len(paramDef.get('choices', [])))]
+    if paramType in ('Float', 'Int', 'Odd', 'Even'):
+        minimum = paramDef['min']
+        maximum = paramDef['max']
+        if paramType == 'Float':
+            decimalplaces = paramDef.get('decimalplaces', 2)
+            steps = int(round((maximum - minimum) * 10 ** decimalplaces))
+            if count < 2 or steps == 0:
+                return [round(minimum, decimalplaces)]
+            return list(dict.fromkeys(round(minimum + (maximum - minimum) * i / (count - 1), decimalplaces) for i in range(count)))
+        values = [value for value in range(math.ceil(minimum), math.floor(maximum) + 1) 
+            if paramType == 'Int' or value % 2 == (1 if paramType == 'Odd' else 0)]
+        if len(values) <= count:
+            return values
+        if count < 2:
+            return values[:1]
+        return list(dict.fromkeys(values[round(i * (len(values) - 1) / (count - 1))] for i in range(count)))
+    raise Exception(f'Parameter type {paramType} can not be swept')
+
+def parameterGrid(response, ranges):
+    """Cartesian product of parameter values
+
+    ranges maps parameter ids, names or displaynames to either a list of values or
+    the number of values to derive using parameterRange. Yields dictionaries of
+    parameter values keyed on parameter id.
+    """
+
+    axes = []
+    for (alias, values) in ranges.items():
+        paramDef = response.parameterById(alias) or response.parameterByName(alias) or response.parameterByDisplayname(alias)
+        if paramDef is None:
+            raise Exception(f'Unknown parameter {alias}')
+        if isinstance(values, int):
+            values = parameterRange(paramDef, count = values)
+        axes.append([(paramDef['id'], value) for value in values])
+    for combination in itertools.product(*axes):
+        yield dict(combination)
+
+class ShapeDiverSweep:
+    """Evaluation of a grid of parameter values using a ShapeDiverSessionPool
+
+    Every point of the grid is computed using a session leased from the pool,
+    computing all outputs and the given exports. At most maxConcurrency points are
+    evaluated at once (limited by the size of the pool as well). If the sessions of
+    the pool use a result cache, the results are thereby pre-warmed for later requests,
+    and kept for ttl seconds if given instead of the ttl of the cache. If they use an 
+    export cache, the export artifacts are downloaded into it.
+
+    If checkpointPath is given, completed points are appended to this file (JSON lines),
+    and points already contained in it are skipped, which makes sweeps resumable.
+    """
+
+    def __init__(self, *, pool, points, exportIds=(), maxConcurrency=4, checkpointPath=None, ttl=None):
+        self.pool = pool
+        self.points = points
+        self.exportIds = list(exportIds)
+        self.maxConcurrency = maxConcurrency
+        self.checkpointPath = checkpointPath
+        self.ttl = ttl
+        self.counters = {'completed': 0, 'skipped': 0, 'failed': 0}
+        self.failures = []
+        self.lock = threading.Lock()
+
+    def run(self, *, onResult=None):
+        """Evaluate all points, returns counters of completed, skipped and failed points
+
+        onResult is called with the parameter values and the ShapeDiverComputation 
+        of every completed point.
+        """
+
+        completed = self._loadCheckpoint()
+        workers = max(1, min(self.maxConcurrency, self.pool.maxSessions))
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='shapediver-sweep') as executor:
+            # bound the number of queued points, grids may be large
+            pending = threading.BoundedSemaphore(workers * 2)
+            for point in self.points:
+                key = canonicalParameters(point)
+                if key in completed:
+                    self._count('skipped')
+                    continue
+                pending.acquire()
+                future = executor.submit(instrumentation.bind(self._evaluate), point, key, onResult)
+                future.add_done_callback(lambda future: pending.release())
+        return dict(self.counters, seconds=time.monotonic() - start)
+
+    def _evaluate(self, point, key, onResult):
+        try:
+            with self.pool.lease() as sdk:
+                computation = sdk.compute(exportIds = self.exportIds, paramDict = point)
+            computation.output()
+            for exportId in self.exportIds:
+                if sdk.exportCache is not None:
+                    computation.exportAsset(exportId)
+                else:
+                    computation.export(exportId)
+        except Exception as e:
+            self._count('failed')
+            with self.lock:
+                self.failures.append((point, e))
+            return
+        self._keep(sdk, computation)
+        self._checkpoint(key)
+        self._count('completed')
+        if onResult is not None:
+            onResult(point, computation)
+
+    def _keep(self, sdk, computation):
+        """Let the cached results of a point expire after ttl seconds"""
+
+        if self.ttl is None or sdk.resultCache is None:
+            return
+        for exportId in [None] + self.exportIds:
+            sdk.resultCache.expire(ShapeDiverResultCache.key(model = sdk.modelKey(), exportId = exportId, paramDict = computation.paramDict), ttl = self.ttl)
+
+    def _loadCheckpoint(self):
+        if self.checkpointPath is None or not os.path.exists(self.checkpointPath):
+            return set()
+        with open(self.checkpointPath) as file:
+            return set(json.loads(line) for line in file if line.strip())
+
+    def _checkpoint(self, key):
+        if self.checkpointPath is None:
+            return
+        with self.lock:
+            with open(self.checkpointPath, 'a') as file:
+                file.write(json.dumps(key) + '\n')
+
+    def _count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
@@ -1,7 +1,7 @@
 from viktor import ViktorController, File, UserMessage, UserError
 from viktor.parametrization import ViktorParametrization, Text, TextField, NumberField, Section, Image, OptionField, OptionListElement, BooleanField
 from viktor.views import GeometryView, GeometryResult, ImageView, ImageResult, PDFView, PDFResult
-from ShapeDiverTinySdkViktorUtils import ShapeDiverTinySessionSdkMemoized
+from ShapeDiverTinySdkViktorUtils import ShapeDiverTinySessionSdkPooled, instrumentedView, outputAssetCache
 import os
 
 # ShapeDiver ticket and modelViewUrl
@@ -35,12 +35,34 @@ The code for this sample app is available on [GitHub](https://github.com/shapedi
     parameters.param8 = OptionField('Render Settings', name='ShapeDiverParams.99459452-6f89-4c85-b0f3-3b258b1f2199', options=_param8Options, default='1')
     parameters.param9 = NumberField('Deformation Scale', name='ShapeDiverParams.f582e03d-ec6f-4820-933e-a5ceefb9163e', default=100, min=0, max=100, num_decimals=0, step=1.0, variant='slider')
 
+def computeStage(parameters):
+    """Computation stage shared by the views, for one set of parameter values
+
+    Starts the computation of the glTF outputs together with the image and PDF 
+    exports, each view then waits for its part only. Results are cached and 
+    concurrent identical computations are shared, so that switching between the 
+    views for the same parameter values costs no further computation or upload.
+    Returns the ShapeDiverComputation and the ids of the exports by displayname.
+    """
+
+    # Lease a warm session with the model from the pool, it is returned once the computation has finished
+    with ShapeDiverTinySessionSdkPooled(ticket, modelViewUrl) as shapeDiverSessionSdk:
+
+        # get ids of image and PDF export
+        exportIds = {name: shapeDiverSessionSdk.response.exportByDisplayname(name)['id'] for name in ('Download Png', 'Download Pdf')}
+
+        # compute outputs and exports
+        computation = shapeDiverSessionSdk.compute(exportIds = list(exportIds.values()), paramDict = parameters)
+
+    return (computation, exportIds)
+
 class Controller(ViktorController):
     label = 'ShapeDiver'
     parametrization = Parametrization
     
   
     @GeometryView('ShapeDiver Output Geometry', duration_guess=1, update_label='Run ShapeDiver Computation', up_axis='Y')
+    @instrumentedView('geometry')
     def runShapeDiver(self, params, **kwargs):
         
         # Debug output
@@ -49,11 +71,10 @@ class Controller(ViktorController):
         # Get parameter values from section "ShapeDiverParams"
         parameters = params.ShapeDiverParams
 
-        # Initialize a session with the model (memoized)
-        shapeDiverSessionSdk = ShapeDiverTinySessionSdkMemoized(ticket, modelViewUrl)
-
-        # compute outputs of ShapeDiver model, get resulting glTF 2 assets
-        contentItemsGltf2 = shapeDiverSessionSdk.output(paramDict = parameters).outputContentItemsGltf2()
+        # get the resulting glTF 2 assets of the shared computation
+        (computation, exportIds) = computeStage(parameters)
+        output = computation.output()
+        contentItemsGltf2 = output.outputContentItemsGltf2()
         
         if len(contentItemsGltf2) < 1:
             raise UserError('Computation did not result in at least one glTF 2.0 asset.')
@@ -61,11 +82,15 @@ class Controller(ViktorController):
         if len(contentItemsGltf2) > 1: 
             UserMessage.warning(f'Computation resulted in {contentItemsGltf2.count} glTF 2.0 assets, only displaying the first one.')
 
-        glTF_file = File.from_url(contentItemsGltf2[0]['href'])
+        # unchanged outputs are served from the asset cache, held in memory
+        # since the cached file may be replaced while VIKTOR reads it
+        (glTF,) = outputAssetCache.download(output, contentItemsGltf2[:1], mode = 'memory')
+        glTF_file = File.from_data(glTF.data())
 
         return GeometryResult(geometry=glTF_file)
 
     @ImageView("Image", duration_guess=1, update_label='Run ShapeDiver Image Export')
+    @instrumentedView('image')
     def runShapeDiverImageExport(self, params, **kwargs):
 
         # Debug output
@@ -74,26 +99,19 @@ class Controller(ViktorController):
         # Get parameter values from section "parameters"
         parameters = params.ShapeDiverParams
 
-        # Initialize a session with the model (memoized)
-        shapeDiverSessionSdk = ShapeDiverTinySessionSdkMemoized(ticket, modelViewUrl)
-
-        # get id of image export
-        imageExportId = [exp['id'] for exp in shapeDiverSessionSdk.response.exports() if exp['displayname'] == 'Download Png'][0]
+        # get the image export of the shared computation, repeated exports are read from the export cache
+        (computation, exportIds) = computeStage(parameters)
+        image = computation.exportAsset(exportIds['Download Png'], mode = 'memory')
 
-        # run the export
-        exportItems = shapeDiverSessionSdk.export(exportId = imageExportId, paramDict = parameters).exportContentItems()
-            
-        if len(exportItems) < 1:
+        if image is None:
             raise UserError('Export did not result in an image.')
-        
-        if len(exportItems) > 1: 
-            UserMessage.warning(f'Export resulted in {exportItems.count} images, only displaying the first one.')
 
-        image_file = File.from_url(exportItems[0]['href'])
+        image_file = File.from_data(image.data())
 
         return ImageResult(image_file)
 
     @PDFView("PDF", duration_guess=1, update_label='Run ShapeDiver PDF Export')
+    @instrumentedView('pdf')
     def runShapeDiverPdfExport(self, params, **kwargs):
 
         # Debug output
@@ -102,22 +120,14 @@ class Controller(ViktorController):
         # Get parameter values from section "parameters"
         parameters = params.ShapeDiverParams
 
-        # Initialize a session with the model (memoized)
-        shapeDiverSessionSdk = ShapeDiverTinySessionSdkMemoized(ticket, modelViewUrl)
+        # get the PDF export of the shared computation, repeated exports are read from the export cache
+        (computation, exportIds) = computeStage(parameters)
+        pdf = computation.exportAsset(exportIds['Download Pdf'], mode = 'memory')
 
-        # get id of image export
-        pdfExportId = [exp['id'] for exp in shapeDiverSessionSdk.response.exports() if exp['displayname'] == 'Download Pdf'][0]
-
-        # run the export
-        exportItems = shapeDiverSessionSdk.export(exportId = pdfExportId, paramDict = parameters).exportContentItems()
-            
-        if len(exportItems) < 1:
+        if pdf is None:
             raise UserError('Export did not result in a PDF.')
-        
-        if len(exportItems) > 1: 
-            UserMessage.warning(f'Export resulted in {exportItems.count} PDFs, only displaying the first one.')
 
-        pdf_file = File.from_url(exportItems[0]['href'])
+        pdf_file = File.from_data(pdf.data())
 
         return PDFResult(file=pdf_file)
         
\ No newline at end of file
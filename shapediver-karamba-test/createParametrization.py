@@ -1,6 +1,6 @@
 import json
 import os
-from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverColorToRgb, mapContentTypeToFileEnding
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverColorToRgb, mimeRegistry
 
 def createParametrization(ticket, modelViewUrl):
 
@@ -38,12 +38,12 @@ def createParametrization(ticket, modelViewUrl):
             print(f"{varname} = OptionField('{ui_name}', name='{name}', options={varnameOptions}, default='{param['defval']}')")
         elif param['type'] == 'File':
             # see https://docs.viktor.ai/sdk/api/parametrization/#_FileField
-            # mapping of filename to content-type to be implemented
+            # all file endings of the content-types accepted by the parameter
             fileEndings = []
             for item in param['format']:
-                fileEnding = mapContentTypeToFileEnding(item)
-                if fileEnding is not None:
-                    fileEndings.append(f".{fileEnding}")
+                for fileEnding in mimeRegistry.fileEndings(item):
+                    if f".{fileEnding}" not in fileEndings:
+                        fileEndings.append(f".{fileEnding}")
             print(f"{varname} = FileField('{ui_name}', name='{name}', max_size={param['max']}, file_types={str(fileEndings)})")
         elif param['type'] == 'Color':
             rgb = ShapeDiverColorToRgb(param['defval'])
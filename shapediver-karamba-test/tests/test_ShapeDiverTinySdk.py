@@ -0,0 +1,537 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from ShapeDiverTinySdk import (ShapeDiverTinySessionSdk, ShapeDiverResponse, downloadAssets, ShapeDiverRetryPolicy, ShapeDiverLruCache, ShapeDiverResultCache,
+    ShapeDiverSessionPool, ShapeDiverSessionPoolCache, ShapeDiverParameterValidator, ShapeDiverValidationError,
+    ShapeDiverParameterQuantizer, ShapeDiverSingleFlight, ShapeDiverDiskCache, ShapeDiverAssetCache, ShapeDiverExportCache, configureHttpTransport, httpTransport, httpTransportStats,
+    ShapeDiverHistogramRegistry, ShapeDiverLogTracer, instrumentation, mimeRegistry, mapFileEndingToContentType, mapContentTypeToFileEnding)
+
+def session(emulator, **options):
+    return ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url, **options)
+
+# transport
+
+def testSessionsShareKeepAliveConnections(emulator):
+    first = session(emulator)
+    second = session(emulator, sessionInitResponse = first.response)
+    assert first.transport is second.transport is httpTransport(emulator.url + '/api/v2/ticket')
+    for count in (1, 2, 3):
+        first.output(paramDict = {'p-count': count})
+        second.output(paramDict = {'p-count': count + 3})
+    stats = httpTransportStats()[emulator.url]
+    assert (stats['requests'], stats['misses'], stats['hits']) == (7, 1, 6)
+
+def testConnectionsAreClosedWithoutKeepAlive(emulator):
+    configureHttpTransport(keepAlive = False)
+    try:
+        sdk = session(emulator)
+        sdk.output(paramDict = {'p-count': 1})
+        sdk.output(paramDict = {'p-count': 2})
+        assert httpTransportStats()[emulator.url]['hits'] == 0
+        assert httpTransportStats()[emulator.url]['misses'] == 3
+    finally:
+        configureHttpTransport(keepAlive = True)
+
+# retries
+
+def testRateLimitedRequestsAreRetriedAfterRetryAfter(emulator):
+    emulator.rateLimitRate = 1
+    emulator.retryAfter = 0.05
+    events = []
+    def onRetry(event):
+        events.append(event)
+        emulator.rateLimitRate = 0
+    sdk = session(emulator, retryPolicy = ShapeDiverRetryPolicy(onRetry = onRetry))
+    result = sdk.output(paramDict = {'p-count': 5})
+    assert result.outputByName('Mass') is not None
+    assert [(event['reason'], event['statusCode'], event['wait']) for event in events] == [('rateLimit', 429, 0.05)]
+    assert emulator.stats()['rateLimited'] == 1
+
+def testDelayedComputationsArePolled(emulator):
+    emulator.delayRate = 1
+    emulator.delay = 20
+    events = []
+    sdk = session(emulator, retryPolicy = ShapeDiverRetryPolicy(jitter = 0, onRetry = events.append))
+    result = sdk.output(paramDict = {'p-count': 5})
+    assert result.delay() is None
+    assert [(event['reason'], event['wait']) for event in events] == [('delay', 0.02)]
+
+def testRetriesGiveUpAtTheDeadline(emulator):
+    emulator.rateLimitRate = 1
+    emulator.retryAfter = 0.05
+    sdk = session(emulator, retryPolicy = ShapeDiverRetryPolicy(deadline = 0.2))
+    with pytest.raises(Exception, match='within 0.2 seconds'):
+        sdk.output(paramDict = {'p-count': 5})
+
+def testRetryAfterHttpDate():
+    policy = ShapeDiverRetryPolicy()
+    assert policy.retryAfter(SimpleNamespace(headers = {'Retry-After': '2.5'})) == 2.5
+    assert policy.retryAfter(SimpleNamespace(headers = {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+    assert policy.retryAfter(SimpleNamespace(headers = {'Retry-After': 'soon'})) is None
+    assert policy.retryAfter(SimpleNamespace(headers = {})) is None
+
+class GatewayErrorTransport:
+    """Transport answering the first requests with the given status codes, after sending them"""
+
+    def __init__(self, url, statusCodes):
+        self.transport = httpTransport(url)
+        self.statusCodes = list(statusCodes)
+
+    def request(self, method, url, **kwargs):
+        response = self.transport.request(method, url, **kwargs)
+        if len(self.statusCodes) == 0:
+            return response
+        return SimpleNamespace(status_code = self.statusCodes.pop(0), headers = {'Retry-After': '0'}, text = 'gateway error', content = b'')
+
+def testOpeningSessionIsNotRetriedOnGatewayErrors(emulator):
+    with pytest.raises(Exception, match='HTTP status code 502'):
+        session(emulator, transport = GatewayErrorTransport(emulator.url, [502]))
+    assert emulator.stats()['openSession'] == 1
+    sdk = session(emulator, transport = GatewayErrorTransport(emulator.url, [429]))
+    assert sdk.response.sessionId() is not None
+    # computations are retried on gateway errors
+    sdk.transport.statusCodes = [503]
+    assert sdk.output(paramDict = {'p-count': 5}).outputByName('Mass') is not None
+
+# caches
+
+def testLruCacheEvictsLeastRecentlyUsed():
+    cache = ShapeDiverLruCache(maxEntries = 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+    assert cache.stats()['evictions'] == 1
+
+def testLruCacheExpiresEntries():
+    cache = ShapeDiverLruCache(ttl = 0.05)
+    cache.put('a', 1)
+    cache.put('b', 2, ttl = 10)
+    time.sleep(0.1)
+    assert (cache.get('a'), cache.get('b')) == (None, 2)
+    assert cache.stats()['expirations'] == 1
+
+def testLruCacheStaysWithinByteBudget():
+    cache = ShapeDiverLruCache(maxBytes = 10, sizeOf = len)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'xxxx')
+    cache.put('c', 'xxxx')
+    cache.put('d', 'x' * 11)
+    assert (cache.get('a'), cache.get('d')) == (None, None)
+    assert cache.stats()['bytes'] == 8
+
+def testResultCacheServesRepeatedComputations(emulator):
+    cache = ShapeDiverResultCache()
+    first = session(emulator, resultCache = cache)
+    second = session(emulator, resultCache = cache)
+    result = first.output(paramDict = {'p-count': 5})
+    # parameter values with the same canonical representation share the result
+    assert second.output(paramDict = {'p-count': 5.0}) is result
+    assert emulator.stats()['computeOutputs'] == 1
+
+# session pool
+
+def testPoolKeepsSessionOnValidationError(emulator):
+    def exceptionHandler(e):
+        raise ValueError(str(e))
+    pool = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 0, maxSessions = 1,
+        exceptionHandler = exceptionHandler, parameterValidator = ShapeDiverParameterValidator())
+    try:
+        with pytest.raises(ValueError):
+            with pool.lease() as first:
+                first.output(paramDict = {'p-count': 500})
+        with pool.lease() as second:
+            assert second is first
+        assert pool.stats()['opened'] == 1
+    finally:
+        pool.close()
+
+def testPoolProbeReopensExpiredSession(emulator):
+    pool = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 1, maxSessions = 1, healthCheckInterval = 0.05)
+    try:
+        with pool.lease() as sdk:
+            sessionId = sdk.response.sessionId()
+        emulator.expireSessions()
+        deadline = time.monotonic() + 5
+        while sdk.response.sessionId() == sessionId and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert sdk.response.sessionId() != sessionId
+        assert sdk.healthy
+    finally:
+        pool.close()
+
+def testPoolPrewarmsOnlyAfterSuccessfulLease(emulator):
+    pool = ShapeDiverSessionPool(ticket = 'invalid', modelViewUrl = emulator.url, minSessions = 1, healthCheckInterval = 0.05)
+    try:
+        time.sleep(0.2)
+        assert emulator.stats().get('openSession', 0) == 0
+        with pytest.raises(Exception, match='HTTP status code 401'):
+            pool.acquire()
+        time.sleep(0.3)
+        assert emulator.stats()['openSession'] == 1
+    finally:
+        pool.close()
+
+def testPoolStopsPrewarmingWhenIdle(emulator):
+    pool = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 1, maxIdle = 0.2, healthCheckInterval = 0.05)
+    try:
+        with pool.lease():
+            pass
+        time.sleep(0.6)
+        assert pool.stats()['open'] == 0
+        assert emulator.stats()['openSession'] == 1
+    finally:
+        pool.close()
+
+def testEvictedPoolsAreClosed(emulator):
+    pools = ShapeDiverSessionPoolCache(maxEntries = 1)
+    first = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 0)
+    pools.put('first', first)
+    with first.lease():
+        pass
+    pools.put('second', ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 0))
+    assert first.closed and first.stats()['open'] == 0
+    pools.clear()
+    assert len(pools) == 0
+
+# session expiry
+
+def testExpiredSessionIsReopenedOnce(emulator):
+    emulator.computeLatency = 0.05
+    sdks = [session(emulator)]
+    sdks += [session(emulator, sessionInitResponse = sdks[0].response) for i in range(3)]
+    emulator.expireSessions()
+    threads = [threading.Thread(target = sdk.output, kwargs = {'paramDict': {'p-count': 3}}) for sdk in sdks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # one session init for the sessions, one to re-open it
+    assert emulator.stats()['openSession'] == 2
+    assert len({sdk.response.sessionId() for sdk in sdks}) == 1
+
+def testExpiredSessionWithoutTicketFails(emulator):
+    sdk = ShapeDiverTinySessionSdk(sessionInitResponse = session(emulator).response, modelViewUrl = emulator.url)
+    emulator.expireSessions()
+    with pytest.raises(Exception, match='ticket is unknown'):
+        sdk.output(paramDict = {'p-count': 3})
+
+# batch exports
+
+def testExportsAreComputedInOneRequest(sdk, emulator):
+    results = sdk.exports(exportIds = ['e-png', 'e-pdf'], paramDict = {'p-count': 3})
+    assert emulator.stats()['computeExports'] == 1
+    assert [list(results[exportId].response['exports']) for exportId in ('e-png', 'e-pdf')] == [['e-png'], ['e-pdf']]
+    assert results['e-pdf'].exportContentItems()[0]['contentType'] == 'application/pdf'
+    assert sdk.export(exportId = 'e-png', paramDict = {'p-count': 3}) is results['e-png']
+    assert emulator.stats()['computeExports'] == 1
+
+# downloads
+
+def testAssetsAreDownloadedConcurrently(sdk, emulator):
+    items = [sdk.output(paramDict = {'p-count': count}).outputContentItemsGltf2()[0] for count in (1, 2, 3, 4)]
+    emulator.latency = 0.2
+    start = time.perf_counter()
+    downloads = downloadAssets(items, mode = 'memory')
+    assert time.perf_counter() - start < 0.6
+    assert [download.href for download in downloads] == [item['href'] for item in items]
+    assert all(download.seconds >= 0.2 and download.size == emulator.assetSize for download in downloads)
+    assert downloads[0].data() != downloads[1].data()
+
+def testDownloadModes(sdk):
+    item = sdk.output(paramDict = {'p-count': 3}).outputContentItemsGltf2()[0]
+    (file, mapped, memory) = [downloadAssets([item], mode = mode)[0] for mode in ('file', 'mmap', 'memory')]
+    assert file.path.endswith('.glb') and mapped.path is None and memory.path is None
+    assert file.data() == mapped.data() == memory.data()
+    assert file.contentType == 'model/gltf-binary'
+    with pytest.raises(Exception, match='Unknown download mode'):
+        downloadAssets([item], mode = 'stream')
+
+# responses
+
+def testResponseIndexes():
+    response = ShapeDiverResponse('{"parameters": {"a": {"id": "a", "name": "A", "displayname": "First"}, "b": {"id": "b", "name": "A"}}, "outputs": {}, "exports": {}}')
+    assert response.parameterByName('A')['id'] == 'a'
+    assert response.parameterByDisplayname('First')['id'] == 'a'
+    assert response.parameterById('b')['name'] == 'A'
+    assert response.parameterByName('missing') is None
+
+# content types
+
+def testMimeRegistry():
+    assert mapFileEndingToContentType('model.gltf') == 'model/gltf+json'
+    assert mapFileEndingToContentType('MODEL.GLB') == 'model/gltf-binary'
+    assert mapContentTypeToFileEnding('image/jpeg') == 'jpg'
+    assert mimeRegistry.contentTypes('csv') == ('text/csv', 'application/vnd.ms-excel')
+    assert mimeRegistry.negotiate('points.csv', ['application/vnd.ms-excel']) == 'application/vnd.ms-excel'
+    assert mimeRegistry.negotiate('points.csv', ['application/json']) is None
+    assert mimeRegistry.contentType('unknown') is None
+
+# parameter validation
+
+def testValidatorCoercesAndRejects(sdk):
+    validator = ShapeDiverParameterValidator()
+    values = validator.validate(response = sdk.response, paramDict = {'p-length': '12.345', 'p-count': 3.0, 'p-closed': True, 'p-profile': 2, 'other': 'x'})
+    assert values == {'p-length': 12.35, 'p-count': 3, 'p-closed': 'true', 'p-profile': '2', 'other': 'x'}
+    for paramDict in ({'p-length': 0.5}, {'p-count': 2.5}, {'p-closed': 'maybe'}, {'p-profile': 3}, {'p-color': 'red'}, {'p-label': 'x' * 101}):
+        with pytest.raises(ShapeDiverValidationError):
+            validator.validate(response = sdk.response, paramDict = paramDict)
+    assert validator.stats() == {'validated': 1, 'avoidedCalls': 6}
+
+def testInvalidValuesAreRejectedWithoutRequest(emulator):
+    sdk = session(emulator, parameterValidator = ShapeDiverParameterValidator())
+    with pytest.raises(ShapeDiverValidationError):
+        sdk.output(paramDict = {'p-count': 21})
+    assert emulator.stats().get('computeOutputs', 0) == 0
+
+# parameter deltas
+
+def testDuplicateRequestsAreSuppressed(sdk, emulator):
+    result = sdk.output(paramDict = {'p-count': 5})
+    assert sdk.output(paramDict = {'p-count': 5}) is result
+    # values equal to the defaults are not sent
+    sdk.output(paramDict = {'p-count': 4})
+    sdk.output(paramDict = {})
+    assert emulator.stats()['computeOutputs'] == 2
+    assert sdk.counters['duplicateRequests'] == 2
+
+# parameter quantization
+
+def testQuantizerCollapsesNumericalNoise(sdk):
+    quantizer = ShapeDiverParameterQuantizer()
+    assert quantizer.quantize(response = sdk.response, paramDict = {'p-length': 0.5000000001}) == {'p-length': 0.5}
+    assert quantizer.quantize(response = sdk.response, paramDict = {'p-length': 0.5}) == {'p-length': 0.5}
+    # values exceeding the range by less than half a step are snapped into it
+    assert quantizer.quantize(response = sdk.response, paramDict = {'p-length': 100.004, 'p-count': 20.0000000001}) == {'p-length': 100, 'p-count': 20}
+    assert quantizer.stats()['collapsedKeys'] == 1
+
+def testQuantizerLeavesNonIntegersToValidation():
+    response = ShapeDiverResponse({'parameters': {'p-odd': {'id': 'p-odd', 'type': 'Odd', 'min': 1, 'max': 9}}})
+    quantizer = ShapeDiverParameterQuantizer()
+    values = [quantizer.quantize(response = response, paramDict = {'p-odd': value})['p-odd'] for value in (4.6, 2.5, 3.5, 2.9999999999, '5')]
+    assert values == [4.6, 2.5, 3.5, 3, 5]
+    validator = ShapeDiverParameterValidator()
+    for value in (4.6, 2.5, 3.5):
+        with pytest.raises(ShapeDiverValidationError, match='is not an integer'):
+            validator.validate(response = response, paramDict = quantizer.quantize(response = response, paramDict = {'p-odd': value}))
+
+# instrumentation
+
+class SpanCollector:
+    """Sink collecting the spans reported while it is used in a with statement"""
+
+    def __init__(self):
+        self.spans = []
+
+    def record(self, span):
+        self.spans.append(span)
+
+    def __enter__(self):
+        instrumentation.addSink(self)
+        return self
+
+    def __exit__(self, *exc):
+        instrumentation.removeSink(self)
+
+def testSpansTieRequestsToTheirView(sdk):
+    with SpanCollector() as collector:
+        with instrumentation.span('view', view='geometry') as view:
+            # computations run on another thread
+            computation = sdk.compute(exportIds = ['e-png'], paramDict = {'p-count': 3})
+            computation.export('e-png')
+            computation.output()
+    spansById = {span.spanId: span for span in collector.spans}
+    assert {span.traceId for span in collector.spans} == {view.traceId}
+    http = [span for span in collector.spans if span.name == 'http']
+    assert {span.labels['action'] for span in http} == {'compute outputs', 'compute export'}
+    for span in http:
+        request = spansById[span.parentId]
+        assert request.name == 'request' and request.parentId == view.spanId
+        assert span.labels['status'] == '200' and span.attributes['responseBytes'] > 0
+    assert view.parentId is None and view.labels['outcome'] == 'ok'
+
+def testLogTracerWritesSpansAsJson(caplog):
+    tracer = ShapeDiverLogTracer()
+    instrumentation.addSink(tracer)
+    try:
+        with caplog.at_level(logging.INFO, logger = 'shapediver.trace'), pytest.raises(ValueError):
+            with instrumentation.span('view', view='image'):
+                with instrumentation.span('parse') as span:
+                    span.set(bytes = 10)
+                raise ValueError('failed')
+    finally:
+        instrumentation.removeSink(tracer)
+    (parse, view) = [json.loads(record.getMessage()) for record in caplog.records]
+    assert (parse['span'], parse['parentId'], parse['traceId']) == ('parse', view['spanId'], view['traceId'])
+    assert parse['attributes'] == {'bytes': 10} and 'error' not in parse
+    assert view['labels'] == {'view': 'image', 'outcome': 'error'} and view['error'] == 'ValueError: failed'
+
+def testPrometheusFormatKeepsPrecision():
+    registry = ShapeDiverHistogramRegistry()
+    registry.observe('shapediver_download_bytes', 123456789, buckets = registry.bytesBuckets)
+    registry.observe('shapediver_download_bytes', 1000, buckets = registry.bytesBuckets)
+    text = registry.prometheus()
+    assert 'shapediver_download_bytes_bucket{le="1048576.0"} 1' in text
+    assert 'shapediver_download_bytes_bucket{le="+Inf"} 2' in text
+    assert 'shapediver_download_bytes_sum 123457789.0' in text
+
+# single-flight
+
+def testSingleFlightSharesComputation():
+    singleFlight = ShapeDiverSingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return 'result'
+    results = []
+    leader = threading.Thread(target = lambda: results.append(singleFlight.do('key', compute)))
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target = lambda: results.append(singleFlight.do('key', compute))) for i in range(3)]
+    for follower in followers:
+        follower.start()
+    while singleFlight.stats()['coalesced'] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [('result', False)] + [('result', True)] * 3
+    assert singleFlight.stats() == {'computations': 1, 'coalesced': 3, 'inFlight': 0}
+
+def testSingleFlightSharesExceptions():
+    singleFlight = ShapeDiverSingleFlight()
+    def compute():
+        raise ValueError('failed')
+    with pytest.raises(ValueError):
+        singleFlight.do('key', compute)
+    # nothing is kept once the computation finished
+    assert singleFlight.do('key', lambda: 1) == (1, False)
+
+def testConcurrentSessionsShareOneComputation(emulator):
+    emulator.computeLatency = 0.2
+    singleFlight = ShapeDiverSingleFlight()
+    first = session(emulator, singleFlight = singleFlight)
+    sdks = [first] + [session(emulator, sessionInitResponse = first.response, singleFlight = singleFlight) for i in range(3)]
+    threads = [threading.Thread(target = sdk.output, kwargs = {'paramDict': {'p-count': 7}}) for sdk in sdks]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert emulator.stats()['computeOutputs'] == 1
+    assert sum(sdk.counters['coalescedRequests'] for sdk in sdks) == 3
+
+# computation stage
+
+def testComputeRunsOutputsAndExportsConcurrently(emulator):
+    emulator.computeLatency = 0.2
+    sdk = session(emulator)
+    start = time.perf_counter()
+    computation = sdk.compute(exportIds = ['e-png', 'e-pdf'], paramDict = {'p-count': 3})
+    computation.output()
+    computation.export('e-pdf')
+    assert time.perf_counter() - start < 0.35
+    assert (emulator.stats()['computeOutputs'], emulator.stats()['computeExports']) == (1, 1)
+
+def testPoolHoldsSessionUntilComputationFinished(emulator):
+    emulator.computeLatency = 0.2
+    pool = ShapeDiverSessionPool(ticket = emulator.ticket, modelViewUrl = emulator.url, minSessions = 0, maxSessions = 1)
+    try:
+        with pool.lease() as sdk:
+            computation = sdk.compute(exportIds = ['e-png'], paramDict = {'p-count': 3})
+        with pool.lease() as other:
+            assert other is sdk
+            assert computation.outputs.done() and computation.exports.done()
+    finally:
+        pool.close()
+
+# disk caches
+
+def writeFile(data):
+    (fd, path) = tempfile.mkstemp()
+    with os.fdopen(fd, 'wb') as file:
+        file.write(data)
+    return path
+
+def testDiskCacheSurvivesRestart(tmp_path):
+    cache = ShapeDiverDiskCache(directory = str(tmp_path))
+    path = cache.put('a', writeFile(b'first'), fileEnding = 'png')
+    cache.put('b', writeFile(b'second'))
+    restarted = ShapeDiverDiskCache(directory = str(tmp_path))
+    assert restarted.get('a') == path
+    assert restarted.load(restarted.get('b'), mode = 'memory').data() == b'second'
+
+def testDiskCacheEvictsFilesBeyondByteBudget(tmp_path):
+    cache = ShapeDiverDiskCache(directory = str(tmp_path), maxBytes = 10)
+    first = cache.put('a', writeFile(b'x' * 6))
+    cache.put('b', writeFile(b'x' * 6))
+    assert cache.get('a') is None
+    assert not os.path.exists(first)
+    oversized = writeFile(b'x' * 11)
+    assert cache.put('c', oversized) == oversized
+    assert len(os.listdir(tmp_path)) == 1
+
+def testDiskCacheConcurrentPutsOfOneKey(tmp_path):
+    cache = ShapeDiverDiskCache(directory = str(tmp_path))
+    errors = []
+    def put():
+        for i in range(100):
+            path = cache.put('key', writeFile(b'x' * 100), fileEnding = 'png')
+            try:
+                cache.load(path)
+            except FileNotFoundError as e:
+                errors.append(e)
+    threads = [threading.Thread(target = put) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.path.exists(cache.get('key'))
+    assert os.listdir(tmp_path) == [os.path.basename(cache.get('key'))]
+
+def testAssetCacheDownloadsChangedOutputsOnly(emulator, tmp_path):
+    sdk = session(emulator)
+    cache = ShapeDiverAssetCache(directory = str(tmp_path))
+    first = sdk.output(paramDict = {'p-count': 3})
+    (download,) = cache.download(first, first.outputContentItemsGltf2(), mode = 'memory')
+    assert not download.cached and download.size == emulator.assetSize
+    # computed again by another session, with the same versions of the outputs
+    second = session(emulator).output(paramDict = {'p-count': 3})
+    assert second is not first
+    assert second.changedOutputs(first) == []
+    (download,) = cache.download(second, second.outputContentItemsGltf2())
+    assert download.cached
+    third = sdk.output(paramDict = {'p-count': 4})
+    assert 'o-geometry' in third.changedOutputs(second)
+    assert not cache.download(third, third.outputContentItemsGltf2())[0].cached
+    assert emulator.stats()['downloadAsset'] == 2
+
+def testExportCacheServesExportsAcrossRestarts(emulator, tmp_path):
+    sdk = session(emulator, exportCache = ShapeDiverExportCache(directory = str(tmp_path)))
+    asset = sdk.compute(exportIds = ['e-pdf'], paramDict = {'p-count': 3}).exportAsset('e-pdf', mode = 'memory')
+    assert not asset.cached
+    restarted = session(emulator, exportCache = ShapeDiverExportCache(directory = str(tmp_path)))
+    cached = restarted.compute(exportIds = ['e-pdf'], paramDict = {'p-count': 3}).exportAsset('e-pdf', mode = 'memory')
+    assert cached.cached and cached.data() == asset.data()
+    assert cached.contentType == 'application/pdf'
+    assert (emulator.stats()['computeExports'], emulator.stats()['downloadAsset']) == (1, 1)
+
+def testComputePreparesParametersOnce(emulator):
+    quantizer = ShapeDiverParameterQuantizer()
+    validator = ShapeDiverParameterValidator()
+    sdk = session(emulator, parameterQuantizer = quantizer, parameterValidator = validator)
+    computation = sdk.compute(exportIds = ['e-png'], paramDict = {'p-length': 12.3456})
+    computation.output()
+    computation.export('e-png')
+    assert (quantizer.stats()['quantized'], validator.stats()['validated']) == (1, 1)
@@ -0,0 +1,20 @@
+import asyncio
+from ShapeDiverTinySdk import ShapeDiverResultCache
+from ShapeDiverTinySdkAsync import AsyncShapeDiverSessionSdk
+
+def testAsyncSessionHasTheSameSurface(emulator):
+    async def run():
+        sdk = await AsyncShapeDiverSessionSdk.open(ticket = emulator.ticket, modelViewUrl = emulator.url, resultCache = ShapeDiverResultCache())
+        outputs = await asyncio.gather(*[sdk.output(paramDict = {'p-count': count}) for count in (1, 2, 3)])
+        assert await sdk.output(paramDict = {'p-count': 1}) is outputs[0]
+        exports = await sdk.exports(exportIds = ['e-png', 'e-pdf'], paramDict = {'p-count': 1})
+        computation = await sdk.compute(exportIds = ['e-pdf'], paramDict = {'p-count': 4})
+        asset = await computation.exportAsset('e-pdf', mode = 'memory')
+        await sdk.close()
+        return (outputs, exports, await computation.output(), asset)
+    (outputs, exports, output, asset) = asyncio.run(run())
+    assert len({output.outputByName('Mass')['version'] for output in outputs}) == 3
+    assert sorted(exports) == ['e-pdf', 'e-png']
+    assert output.outputByName('Geometry') is not None
+    assert asset.size == emulator.assetSize
+    assert emulator.stats()['computeOutputs'] == 4
@@ -0,0 +1,65 @@
+import pytest
+from ShapeDiverTinySdk import ShapeDiverTinySessionSdk, ShapeDiverResponse
+import ShapeDiverTinySdkResultStore
+from ShapeDiverTinySdkResultStore import ShapeDiverResultStore
+
+# the result store works without NumPy, these tests use its arrays
+np = pytest.importorskip('numpy')
+
+def record(store, paramDict):
+    store.record(kind = 'output', model = 'model', paramDict = paramDict, response = ShapeDiverResponse({'outputs': {}}), seconds = 0.1)
+
+def testComputationsAreRecorded(emulator):
+    store = ShapeDiverResultStore(scalarOutputs = ['Mass'])
+    sdk = ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url, resultStore = store)
+    for count in range(1, 6):
+        sdk.output(paramDict = {'p-count': count})
+    sdk.exports(exportIds = ['e-png'], paramDict = {'p-count': 2})
+    assert len(store) == 6
+    selected = store.query({'kind': 'output', 'param.p-count': (2, 3)}, columns = ['param.p-count', 'param.p-length', 'scalar.Mass'])
+    assert selected['param.p-count'].tolist() == [2, 3]
+    # default values are recorded as well
+    assert selected['param.p-length'].tolist() == [10, 10]
+    assert not np.isnan(selected['scalar.Mass']).any()
+    assert store.query({'kind': 'export'})['href.e-png'][0].startswith(emulator.url)
+
+def testParameterValuesAreTyped(emulator):
+    store = ShapeDiverResultStore()
+    sdk = ShapeDiverTinySessionSdk(ticket = emulator.ticket, modelViewUrl = emulator.url, resultStore = store)
+    for (profile, closed) in (('0', 'false'), ('1', 'true'), ('2', 'true')):
+        sdk.output(paramDict = {'p-profile': profile, 'p-closed': closed, 'p-label': 'truss'})
+    assert store.query({'param.p-profile': (1, 2)}, columns = ['param.p-profile'])['param.p-profile'].tolist() == [1, 2]
+    assert store.query({'param.p-profile': 1, 'param.p-closed': True})['param.p-closed'].tolist() == [1]
+    assert store.query({'param.p-label': 'truss'})['param.p-label'].tolist() == ['truss'] * 3
+    with pytest.raises(Exception, match='which are numbers'):
+        store.query({'param.p-profile': '1'})
+    with pytest.raises(Exception, match='which are strings'):
+        store.query({'param.p-label': (1, 2)})
+
+def testConditionsAreCheckedWithoutNumPy(monkeypatch):
+    monkeypatch.setattr(ShapeDiverTinySdkResultStore, 'np', None)
+    store = ShapeDiverResultStore()
+    record(store, {'i': 1, 'label': 'a'})
+    assert store.query({'param.i': (0, 2)})['param.label'] == ['a']
+    with pytest.raises(Exception, match='which are strings'):
+        store.query({'param.label': 1})
+
+def testRowsAreChunkedAndBounded():
+    store = ShapeDiverResultStore(chunkSize = 10, maxRows = 50)
+    for i in range(105):
+        record(store, {'i': i, 'label': 'odd'} if i % 2 else {'i': i})
+    assert len(store) == 55
+    assert store.columns()['param.i'][0] == 50
+    selected = store.query({'param.i': lambda column: column % 10 == 1}, columns = ['param.i', 'param.label'])
+    assert selected['param.i'].tolist() == [51, 61, 71, 81, 91, 101]
+    assert selected['param.label'].tolist() == ['odd'] * 6
+
+def testStoreIsPersisted(tmp_path):
+    store = ShapeDiverResultStore(path = str(tmp_path), chunkSize = 4)
+    for i in range(10):
+        record(store, {'i': i})
+    store.compact()
+    record(store, {'i': 10})
+    store.flush()
+    restarted = ShapeDiverResultStore(path = str(tmp_path))
+    assert restarted.columns()['param.i'].tolist() == list(range(11))